@@ -0,0 +1,5 @@
+"""Reusable pipeline code for the free shipping A/B test notebooks.
+
+The notebooks add the repository root to ``sys.path`` and import from here,
+e.g. ``from src.data_loader import load_raw``.
+"""
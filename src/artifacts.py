@@ -0,0 +1,181 @@
+"""Memory-mapped columnar artifacts for the processed-data handoff.
+
+Each processed table (order_totals, experiment_design, experiment_results,
+analysis_results) is written next to its CSV as a directory
+
+    data/processed/<name>.cols/
+        meta.json          row count and, per column, file, dtype and kind
+        <column>.npy       one NumPy array per column
+
+Numeric and boolean columns are stored as-is and opened with
+``mmap_mode='r'``, so reading ``final_revenue`` and ``group`` from
+experiment_results touches only those two files and never parses text.
+Low-cardinality strings (``group``, ``segment``) are stored as integer codes
+plus a category list in meta.json; other strings (``order_id``) as
+fixed-width UTF-8 bytes.
+
+The CSV stays the table of record: anything may rewrite it (``to_csv`` in
+a notebook, ``src.chunked_totals`` streaming partitions, an incremental
+refresh). meta.json therefore records the size and modification time of the
+CSV the artifact was built with, and ``load_processed`` only trusts an
+artifact whose stamp matches the CSV on disk. On a mismatch, or with no
+artifact yet, it reads the CSV and rebuilds the artifact from it, so
+notebooks work on a fresh checkout too and never see a stale copy.
+"""
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from .data_loader import ROOT_DIR
+
+
+PROCESSED_DIR = ROOT_DIR / 'data' / 'processed'
+
+FORMAT_VERSION = 2
+
+# Strings with at most this many distinct values are stored as codes
+MAX_CATEGORIES = 1024
+
+
+def artifact_path(name, directory=None):
+    return (directory or PROCESSED_DIR) / f'{name}.cols'
+
+
+def _encode(series):
+    """Return (array, column meta) for one column."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        return codes, {'kind': 'category', 'categories': [str(c) for c in dtype.categories]}
+    if dtype == bool or dtype.kind in 'iuf':
+        return series.to_numpy(), {'kind': 'numeric'}
+    if dtype.kind == 'M':
+        return series.to_numpy().view(np.int64), {'kind': 'datetime', 'unit': np.datetime_data(dtype)[0]}
+
+    values = series.astype(str)
+    if values.nunique() <= MAX_CATEGORIES:
+        categorical = pd.Categorical(values)
+        return categorical.codes, {'kind': 'category', 'categories': list(categorical.categories)}
+    return np.char.encode(values.to_numpy(dtype=str), 'utf-8'), {'kind': 'string'}
+
+
+def csv_stamp(path):
+    """(size, mtime in ns) of a CSV, as recorded in an artifact's meta.json."""
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def save_artifact(df, name, directory=None, source=None):
+    """Write ``df`` as a columnar artifact and return its path.
+
+    ``source`` is the CSV the artifact mirrors; its stamp goes into meta.json.
+    """
+    target = artifact_path(name, directory)
+    tmp = target.with_name(target.name + '.tmp')
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        array, meta = _encode(df[col])
+        meta.update({'name': col, 'file': f'{i:03d}.npy', 'dtype': str(array.dtype)})
+        np.save(tmp / meta['file'], np.ascontiguousarray(array))
+        columns.append(meta)
+
+    meta = {'format': FORMAT_VERSION, 'rows': len(df), 'columns': columns,
+            'source': csv_stamp(source) if source is not None else None}
+    (tmp / 'meta.json').write_text(json.dumps(meta, indent=1))
+
+    # Swap the new version in whole so readers never see a partial artifact
+    if target.exists():
+        shutil.rmtree(target)
+    tmp.rename(target)
+    return target
+
+
+class Artifact:
+    """Read-only view of a columnar artifact.
+
+    ``artifact['final_revenue']`` returns the raw (memory-mapped) array;
+    ``to_frame(columns)`` builds a DataFrame of the requested columns.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.meta = json.loads((path / 'meta.json').read_text())
+        self._columns = {c['name']: c for c in self.meta['columns']}
+
+    def __len__(self):
+        return self.meta['rows']
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def __getitem__(self, name):
+        return np.load(self.path / self._columns[name]['file'], mmap_mode='r')
+
+    def series(self, name):
+        meta = self._columns[name]
+        array = self[name]
+        if meta['kind'] == 'category':
+            values = pd.Categorical.from_codes(array, categories=meta['categories'])
+        elif meta['kind'] == 'string':
+            values = np.char.decode(array, 'utf-8').astype(object)
+        elif meta['kind'] == 'datetime':
+            values = np.asarray(array).view(f"datetime64[{meta['unit']}]")
+        else:
+            values = array
+        return pd.Series(values, name=name, copy=False)
+
+    def to_frame(self, columns=None):
+        columns = columns or self.columns
+        return pd.concat([self.series(col) for col in columns], axis=1)
+
+
+def open_artifact(name, directory=None):
+    """Open a saved artifact without reading any column data."""
+    path = artifact_path(name, directory)
+    if not (path / 'meta.json').exists():
+        raise FileNotFoundError(f"No artifact '{name}' in {path.parent}")
+    return Artifact(path)
+
+
+def save_processed(df, name, directory=None):
+    """Write a processed table as CSV and as a columnar artifact."""
+    directory = directory or PROCESSED_DIR
+    path = directory / f'{name}.csv'
+    df.to_csv(path, index=False)
+    save_artifact(df, name, directory, source=path)
+
+
+def is_current(name, directory=None):
+    """True if the artifact exists and was built from the CSV now on disk."""
+    directory = directory or PROCESSED_DIR
+    meta_path = artifact_path(name, directory) / 'meta.json'
+    csv_path = directory / f'{name}.csv'
+    if not meta_path.exists():
+        return False
+    if not csv_path.exists():
+        return True
+    meta = json.loads(meta_path.read_text())
+    return meta.get('format') == FORMAT_VERSION and meta.get('source') == csv_stamp(csv_path)
+
+
+def load_processed(name, columns=None, directory=None):
+    """Load a processed table from its artifact, rebuilding it first if the CSV has changed."""
+    directory = directory or PROCESSED_DIR
+    if is_current(name, directory):
+        return open_artifact(name, directory).to_frame(columns)
+
+    path = directory / f'{name}.csv'
+    # The default float parser can be off by an ulp; the artifact must match what was written
+    df = pd.read_csv(path, float_precision='round_trip')
+    try:
+        save_artifact(df, name, directory, source=path)
+    except OSError:
+        pass  # read-only checkout: serve the CSV
+    return df[columns] if columns else df
@@ -0,0 +1,222 @@
+"""Deterministic hash-based treatment assignment.
+
+experiment_design draws each order's group at random, so an order's group
+depends on the rest of the batch and cannot be recomputed at checkout. Here
+a unit (order_id, or customer_unique_id to keep a customer in one group)
+is hashed together with the experiment id into one of ``BUCKETS`` buckets,
+and the bucket decides the group:
+
+    bucket = hash(experiment_id, unit) % BUCKETS
+    group  = 'control' if bucket < control_share * BUCKETS else 'treatment'
+
+The hash is BLAKE2b (``hashlib.blake2b``, 8-byte digest) of the UTF-8 string
+``f'{experiment_id}:{unit}'``, read as a little-endian uint64. It depends
+only on the standard library, so any other service can reproduce a bucket
+from the same two strings; ``TEST_VECTORS`` pins a few values. Different
+experiments get independent splits, and the batch form and the per-request
+form (one unit) give the same answer with no shared state. Hashing is a
+Python loop of one digest per unit in both forms; the batch form only
+collects the digests into a uint64 array (``np.frombuffer``) so the bucket
+and group lookups run as array operations. Re-running the batch
+form over the same units reproduces the same design exactly.
+
+    python -m src.assignment batch --output design.csv
+    python -m src.assignment serve --port 8350
+    python -m src.assignment bench
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+import numpy as np
+import pandas as pd
+
+from .artifacts import load_processed
+from .design import GROUPS
+
+
+EXPERIMENT_ID = 'free_shipping_100'
+
+BUCKETS = 10_000
+
+CONTROL_SHARE = 0.5
+
+
+# (experiment id, unit id) -> bucket; any reimplementation of the hash must reproduce these
+TEST_VECTORS = {
+    ('free_shipping_100', 'e481f51cbdc54678b7cc49136f2d6af7'): 2073,
+    ('free_shipping_100', '53cdb2fc8bc7dce0b6741e2150273451'): 8351,
+    ('free_shipping_200', 'e481f51cbdc54678b7cc49136f2d6af7'): 4445,
+}
+
+
+def unit_hashes(units, experiment_id=EXPERIMENT_ID):
+    """uint64 BLAKE2b hash of ``f'{experiment_id}:{unit}'`` for each unit id."""
+    prefix = f'{experiment_id}:'
+    digests = b''.join(hashlib.blake2b(f'{prefix}{unit}'.encode('utf-8'), digest_size=8).digest()
+                       for unit in units)
+    return np.frombuffer(digests, dtype='<u8')
+
+
+def buckets(units, experiment_id=EXPERIMENT_ID):
+    """Bucket (0 .. BUCKETS - 1) of each unit id."""
+    return (unit_hashes(units, experiment_id) % np.uint64(BUCKETS)).astype(np.int64)
+
+
+def check_test_vectors():
+    """Raise RuntimeError if ``buckets`` disagrees with ``TEST_VECTORS``."""
+    for (experiment_id, unit), expected in TEST_VECTORS.items():
+        got = int(buckets([unit], experiment_id)[0])
+        if got != expected:
+            raise RuntimeError(f"bucket of {unit!r} in {experiment_id!r} is {got}, expected {expected}")
+
+
+def groups_of(bucket, control_share=CONTROL_SHARE):
+    """Group name for each bucket."""
+    return np.where(np.asarray(bucket) < round(control_share * BUCKETS), GROUPS[0], GROUPS[1])
+
+
+def assign_units(units, experiment_id=EXPERIMENT_ID, control_share=CONTROL_SHARE):
+    """Batch form: group of every unit id."""
+    return groups_of(buckets(units, experiment_id), control_share)
+
+
+def assign(unit, experiment_id=EXPERIMENT_ID, control_share=CONTROL_SHARE):
+    """Per-request form: (bucket, group) of one unit id."""
+    bucket = int(buckets([unit], experiment_id)[0])
+    return bucket, str(groups_of(bucket, control_share))
+
+
+def assign_frame(df, unit='order_id', experiment_id=EXPERIMENT_ID, control_share=CONTROL_SHARE):
+    """Copy of ``df`` with a ``group`` column assigned from its ``unit`` column."""
+    df = df.copy()
+    df['group'] = assign_units(df[unit], experiment_id, control_share)
+    return df
+
+
+class AssignmentHandler(BaseHTTPRequestHandler):
+    """``GET /assign?unit=<id>[&experiment=<id>]`` -> JSON bucket and group."""
+
+    protocol_version = 'HTTP/1.1'  # keep connections open between requests
+    disable_nagle_algorithm = True  # headers and body go out as separate small writes
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path != '/assign' or 'unit' not in query:
+            self.send_error(404, "use /assign?unit=<id>")
+            return
+
+        experiment_id = query.get('experiment', [self.server.experiment_id])[0]
+        bucket, group = assign(query['unit'][0], experiment_id, self.server.control_share)
+        body = json.dumps({'experiment': experiment_id, 'unit': query['unit'][0],
+                           'bucket': bucket, 'group': group}).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # no per-request logging on the hot path
+
+
+def make_server(host='127.0.0.1', port=8350, experiment_id=EXPERIMENT_ID, control_share=CONTROL_SHARE):
+    """Local stand-in for the checkout assignment service."""
+    server = ThreadingHTTPServer((host, port), AssignmentHandler)
+    server.daemon_threads = True
+    server.experiment_id = experiment_id
+    server.control_share = control_share
+    return server
+
+
+def _percentiles(seconds):
+    micros = np.asarray(seconds) * 1e6
+    return {f'p{q}': np.percentile(micros, q) for q in (50, 90, 99)} | {'max': micros.max()}
+
+
+def benchmark(units, experiment_id=EXPERIMENT_ID):
+    """Latency of the per-request form, in process and over local HTTP (microseconds).
+
+    Also times the batch form over all ``units``. Returns a DataFrame.
+    """
+    units = [str(u) for u in units]
+    rows = {}
+
+    in_process = []
+    for unit in units:
+        start = time.perf_counter()
+        assign(unit, experiment_id)
+        in_process.append(time.perf_counter() - start)
+    rows['in-process'] = _percentiles(in_process)
+
+    server = make_server(port=0, experiment_id=experiment_id)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        connection = http.client.HTTPConnection(*server.server_address)
+        over_http = []
+        for unit in units:
+            start = time.perf_counter()
+            connection.request('GET', f'/assign?unit={quote(unit)}')
+            connection.getresponse().read()
+            over_http.append(time.perf_counter() - start)
+        connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+    rows['http round trip'] = _percentiles(over_http)
+
+    start = time.perf_counter()
+    assign_units(units, experiment_id)
+    elapsed = time.perf_counter() - start
+    rows['batch (per unit)'] = {'p50': elapsed / len(units) * 1e6}
+
+    return pd.DataFrame(rows).T
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hash-based treatment assignment")
+    parser.add_argument('--experiment', default=EXPERIMENT_ID)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    batch = commands.add_parser('batch', help="assign the orders of experiment_design")
+    batch.add_argument('--output', help="write the assigned design to this CSV")
+
+    serve = commands.add_parser('serve', help="run the local assignment service")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8350)
+
+    bench = commands.add_parser('bench', help="per-request latency benchmark")
+    bench.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    check_test_vectors()
+    if args.command == 'batch':
+        design = assign_frame(load_processed('experiment_design').drop(columns='group'),
+                              experiment_id=args.experiment)
+        print(design['group'].value_counts().to_string())
+        if args.output:
+            design.to_csv(args.output, index=False)
+    elif args.command == 'serve':
+        server = make_server(args.host, args.port, args.experiment)
+        print(f"Serving /assign on http://{args.host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    else:
+        units = load_processed('experiment_design', columns=['order_id'])['order_id']
+        print(benchmark(units[:args.requests], args.experiment).round(1).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Bootstrap confidence intervals for the difference in mean final_revenue.
+
+Order revenue is heavy-tailed, so alongside the t-interval of analysis.ipynb
+we want percentile bootstrap intervals, overall and per segment.
+
+Each replicate reweights the orders of each arm: with ``method='multinomial'``
+the weights are resample counts (indices drawn with replacement, counted
+with one ``bincount`` per block), with ``method='poisson'`` independent
+Poisson(1) weights. For a block of replicates the weights form a
+(replicates x orders) matrix ``W``, and a single product ``W @ D`` gives,
+for every replicate, the weighted revenue sum and the weight total of the
+overall arm and each segment (``D`` holds revenue and segment indicator
+columns). Means are their ratio.
+
+Blocks are independent and each draws from its own ``src.rng`` stream keyed
+by (arm, block), so they run in a process pool and give the same result for
+any number of processes. Poisson weights need no total count up front, so
+``PoissonBootstrap`` can also accumulate the same sums over a stream of
+order chunks.
+
+    python -m src.bootstrap --replicates 10000 --processes 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .artifacts import load_processed
+from .design import GROUPS
+from .rng import SEED, stream
+from .simulation import EFFECT_COLUMNS, SEGMENT_LABELS, compute_final_revenue, segment_codes
+from .sufficient_stats import SufficientStats
+
+
+BLOCK_SIZE = 500
+
+
+def design_matrix(revenue, segments):
+    """(orders x 2K) matrix: revenue per cell, then indicator per cell.
+
+    Cells are the whole arm followed by each segment, as in ``EFFECT_COLUMNS``.
+    """
+    indicators = np.column_stack([np.ones(len(revenue))]
+                                 + [segments == s for s in range(len(SEGMENT_LABELS))]).astype(np.float64)
+    return np.hstack([indicators * revenue[:, None], indicators])
+
+
+def resample_weights(rng, size, n, method='multinomial'):
+    """(size x n) bootstrap weights."""
+    if method == 'poisson':
+        return rng.poisson(1.0, size=(size, n))
+    indices = rng.integers(0, n, size=(size, n)) + (np.arange(size) * n)[:, None]
+    return np.bincount(indices.ravel(), minlength=size * n).reshape(size, n)
+
+
+def replicate_means(weights, design):
+    """Weighted mean of every cell for each row of ``weights``."""
+    sums = weights @ design
+    k = design.shape[1] // 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums[:, :k] / sums[:, k:]
+
+
+def _block(designs, block, size, seed, method):
+    """Treatment - control mean differences for one block of replicates."""
+    means = []
+    for arm, design in enumerate(designs):
+        rng = stream(seed, 'bootstrap', arm, block)
+        means.append(replicate_means(resample_weights(rng, size, len(design), method), design))
+    control, treatment = means
+    return treatment - control
+
+
+def arm_designs(experiment_results):
+    """Design matrix of each arm, in ``GROUPS`` order."""
+    revenue = compute_final_revenue(experiment_results)
+    segments = segment_codes(experiment_results['total_price'])
+    groups = experiment_results['group'].to_numpy()
+    return [design_matrix(revenue[groups == g], segments[groups == g]) for g in GROUPS]
+
+
+def bootstrap(experiment_results, n_replicates=10_000, method='multinomial', seed=SEED,
+              block_size=BLOCK_SIZE, processes=1):
+    """Bootstrap replicates of the mean difference, overall and per segment.
+
+    Returns a DataFrame with one row per replicate and ``EFFECT_COLUMNS``.
+    """
+    designs = arm_designs(experiment_results)
+    blocks = [(block, min(block_size, n_replicates - start))
+              for block, start in enumerate(range(0, n_replicates, block_size))]
+
+    if processes == 1 or len(blocks) == 1:
+        diffs = [_block(designs, block, size, seed, method) for block, size in blocks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(_block, designs, block, size, seed, method) for block, size in blocks]
+            diffs = [future.result() for future in futures]
+    return pd.DataFrame(np.vstack(diffs), columns=EFFECT_COLUMNS)
+
+
+def confidence_intervals(replicates, experiment_results, confidence=0.95):
+    """Percentile bootstrap CIs next to the t-intervals of analysis.ipynb."""
+    tail = (1 - confidence) / 2
+    t_intervals = SufficientStats.from_frame(
+        experiment_results.assign(final_revenue=compute_final_revenue(experiment_results))
+    ).summary(confidence)
+    # Match rows by label; a segment without orders in both groups gets NaN
+    t_intervals = t_intervals.rename(index={'Overall': EFFECT_COLUMNS[0]}).reindex(EFFECT_COLUMNS)
+    return pd.DataFrame({
+        'difference': t_intervals['difference'],
+        'bootstrap_se': replicates.std(ddof=1),
+        'bootstrap_lower': replicates.quantile(tail),
+        'bootstrap_upper': replicates.quantile(1 - tail),
+        't_lower': t_intervals['ci_lower'],
+        't_upper': t_intervals['ci_upper'],
+    })
+
+
+class PoissonBootstrap:
+    """Poisson bootstrap accumulated over a stream of order chunks.
+
+    Each ``update`` draws fresh Poisson(1) weights for the chunk's orders and
+    adds ``W @ D`` to the running sums, so no order is kept in memory.
+    """
+
+    def __init__(self, n_replicates=1000, seed=SEED):
+        self.n_replicates = n_replicates
+        self.seed = seed
+        self.chunks = 0
+        k = len(EFFECT_COLUMNS)
+        self.sums = {group: np.zeros((n_replicates, 2 * k)) for group in GROUPS}
+
+    def update(self, experiment_results):
+        """Add a chunk of orders (needs group, total_price, total_shipping, final_price)."""
+        for arm, (group, design) in enumerate(zip(GROUPS, arm_designs(experiment_results))):
+            rng = stream(self.seed, 'bootstrap', arm, self.chunks)
+            weights = resample_weights(rng, self.n_replicates, len(design), 'poisson')
+            self.sums[group] += weights @ design
+        self.chunks += 1
+
+    def replicates(self):
+        """Current replicate differences as a DataFrame."""
+        k = len(EFFECT_COLUMNS)
+        control, treatment = (self.sums[g][:, :k] / self.sums[g][:, k:] for g in GROUPS)
+        return pd.DataFrame(treatment - control, columns=EFFECT_COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap CIs for the mean revenue difference")
+    parser.add_argument('--replicates', type=int, default=10_000)
+    parser.add_argument('--method', choices=['multinomial', 'poisson'], default='multinomial')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE)
+    parser.add_argument('--seed', type=int, default=SEED)
+    args = parser.parse_args()
+
+    results = load_processed('experiment_results',
+                             columns=['group', 'total_price', 'total_shipping', 'final_price'])
+    start = time.perf_counter()
+    replicates = bootstrap(results, args.replicates, args.method, args.seed, args.block_size,
+                           args.processes)
+    print(f"{args.replicates:,} {args.method} replicates in {time.perf_counter() - start:.2f}s\n")
+    print(confidence_intervals(replicates, results).round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
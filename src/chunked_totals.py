@@ -0,0 +1,123 @@
+"""Out-of-core orders -> order_items -> order_totals.
+
+The in-memory path (data_exploration / ``src.order_totals``) loads orders and
+order_items whole. Here both CSVs are streamed in bounded chunks and spilled
+to disk, range-partitioned by the first ``prefix_len`` characters of
+order_id. Each partition is then aggregated on its own with the same
+segment reduction as the in-memory path, and partitions are written out in
+prefix order. Because the partitioning is by key range, the concatenated
+output is already sorted by order_id and identical to the in-memory result.
+
+Peak memory is one input chunk plus one partition. For hex order ids there
+are ``16 ** prefix_len`` partitions; raise ``prefix_len`` as input grows so
+partitions stay small (2 -> 256 partitions, 3 -> 4,096).
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .data_loader import CACHE_DIR, raw_path
+from .order_totals import ORDER_TOTALS_COLUMNS, PROCESSED_DIR, reduce_sorted
+
+
+def _partition_name(prefix):
+    # Hex-encode so any id characters give a safe file name
+    return prefix.encode().hex()
+
+
+def _spill(chunk, spill_dir, kind, prefix_len, seen):
+    """Append each prefix group of a chunk to its partition file."""
+    prefixes = chunk['order_id'].str[:prefix_len]
+    for prefix, part in chunk.groupby(prefixes, sort=False):
+        path = spill_dir / f'{kind}-{_partition_name(prefix)}.csv'
+        part.to_csv(path, mode='a', header=not path.exists(), index=False)
+        seen.add(prefix)
+
+
+def _aggregate_partition(items_path, orders_path):
+    if not items_path.exists() or not orders_path.exists():
+        return None
+
+    items = pd.read_csv(items_path, dtype={'order_id': str}, float_precision='round_trip')
+    order_ids = pd.read_csv(orders_path, dtype={'order_id': str})['order_id']
+    items = items[items['order_id'].isin(order_ids)]
+
+    # Stable sort keeps items of the same order in file order
+    items = items.sort_values('order_id', kind='stable')
+    keys, total_price, total_shipping, num_items = reduce_sorted(
+        items['order_id'].to_numpy(),
+        items['price'].to_numpy(dtype=np.float64),
+        items['freight_value'].to_numpy(dtype=np.float64),
+    )
+    return pd.DataFrame({
+        'order_id': keys,
+        'total_price': total_price,
+        'total_shipping': total_shipping,
+        'num_items': num_items,
+        'order_total': total_price + total_shipping,
+    })
+
+
+def chunked_order_totals(items_path=None, orders_path=None, output=None,
+                         chunksize=100_000, prefix_len=2, spill_dir=None):
+    """Build order_totals from the raw CSVs in bounded memory.
+
+    Writes the result to ``output`` (default data/processed/order_totals.csv)
+    and returns the number of orders written.
+    """
+    items_path = Path(items_path) if items_path else raw_path('order_items')
+    orders_path = Path(orders_path) if orders_path else raw_path('orders')
+    output = Path(output) if output else PROCESSED_DIR / 'order_totals.csv'
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=spill_dir or CACHE_DIR) as tmp:
+        tmp = Path(tmp)
+        prefixes = set()
+
+        # Pass 1: partition the keys of both tables
+        for chunk in pd.read_csv(orders_path, usecols=['order_id'], dtype={'order_id': str},
+                                 chunksize=chunksize):
+            _spill(chunk, tmp, 'orders', prefix_len, prefixes)
+
+        item_columns = ['order_id', 'price', 'freight_value']
+        for chunk in pd.read_csv(items_path, usecols=item_columns, dtype={'order_id': str},
+                                 chunksize=chunksize):
+            _spill(chunk[item_columns], tmp, 'items', prefix_len, prefixes)
+
+        # Pass 2: aggregate partitions in key order and stream them out
+        n_orders = 0
+        header = True
+        for prefix in sorted(prefixes):
+            name = _partition_name(prefix)
+            totals = _aggregate_partition(tmp / f'items-{name}.csv', tmp / f'orders-{name}.csv')
+            if totals is None or totals.empty:
+                continue
+            totals.to_csv(output, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            n_orders += len(totals)
+
+    if header:
+        # No matching orders at all: still write the header
+        pd.DataFrame(columns=ORDER_TOTALS_COLUMNS).to_csv(output, index=False)
+    return n_orders
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Out-of-core order_totals build")
+    parser.add_argument('--items', help="order_items CSV (default data/raw)")
+    parser.add_argument('--orders', help="orders CSV (default data/raw)")
+    parser.add_argument('--output', help="output CSV (default data/processed/order_totals.csv)")
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--prefix-len', type=int, default=2)
+    args = parser.parse_args()
+
+    n_orders = chunked_order_totals(args.items, args.orders, args.output,
+                                    chunksize=args.chunksize, prefix_len=args.prefix_len)
+    print(f"Saved {n_orders:,} orders")
+
+
+if __name__ == '__main__':
+    main()
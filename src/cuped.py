@@ -0,0 +1,120 @@
+"""CUPED / regression adjustment of final_revenue on pre-treatment order_total.
+
+order_total is fixed before assignment, so it cannot be affected by the
+treatment, and it is strongly correlated with final_revenue. CUPED
+subtracts the part of the metric it predicts:
+
+    theta      = Cov(order_total, final_revenue) / Var(order_total)   (both arms pooled)
+    adjusted Y = Y - theta * (X - mean X)
+
+The adjusted difference in means is unbiased for the same effect, with
+variance reduced by a factor of (1 - rho^2), rho being the correlation.
+
+Everything is computed from ``src.sufficient_stats.SufficientStats``
+built with order_total as covariate: per (group, segment) cell n, the two
+means, the m2 of each and their co-moment. They come from one groupby pass
+and merge across chunks like any other ``SufficientStats``.
+
+The CLI sizes the experiment with ``src.power.sample_size``, passing
+(1 - rho^2) as the variance factor.
+
+    python -m src.cuped
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .artifacts import load_processed
+from .design import GROUPS
+from .power import sample_size
+from .simulation import SEGMENT_LABELS, compute_final_revenue
+from .sufficient_stats import SufficientStats, merge_moments
+
+
+def cuped_stats(df, covariate='order_total', metric='final_revenue', group='group'):
+    """``SufficientStats`` of the metric with the covariate's moments, per group and segment."""
+    value = metric if metric in df else compute_final_revenue(df)
+    return SufficientStats.from_frame(df, value=value, group=group, covariate=covariate)
+
+
+def estimate(revenue_stats, segment=None, confidence=0.95):
+    """Unadjusted and CUPED-adjusted treatment - control difference.
+
+    ``revenue_stats`` is a ``SufficientStats`` built with a covariate.
+    """
+    control, treatment = (revenue_stats.cell(group, segment) for group in GROUPS)
+    pooled = merge_moments(control, treatment)
+    theta = pooled['c_xy'] / pooled['m2_x']
+    rho = pooled['c_xy'] / np.sqrt(pooled['m2_x'] * pooled['m2'])
+
+    def variances(cell):
+        raw = cell['m2'] / (cell['n'] - 1)
+        adjusted = (cell['m2'] - 2 * theta * cell['c_xy'] + theta ** 2 * cell['m2_x']) / (cell['n'] - 1)
+        return raw, adjusted
+
+    (c_raw, c_adj), (t_raw, t_adj) = variances(control), variances(treatment)
+    n1, n2 = control['n'], treatment['n']
+    difference = treatment['mean'] - control['mean']
+    adjusted = difference - theta * (treatment['mean_x'] - control['mean_x'])
+
+    se = np.sqrt(c_raw / n1 + t_raw / n2)
+    se_adjusted = np.sqrt(c_adj / n1 + t_adj / n2)
+    t_critical = stats.t.ppf(1 - (1 - confidence) / 2, min(n1 - 1, n2 - 1))
+    _, p_value = stats.ttest_ind_from_stats(treatment['mean'], np.sqrt(t_raw), n2,
+                                            control['mean'], np.sqrt(c_raw), n1)
+    _, p_adjusted = stats.ttest_ind_from_stats(adjusted, np.sqrt(t_adj), n2, 0.0, np.sqrt(c_adj), n1)
+
+    return {
+        'n_control': int(n1),
+        'n_treatment': int(n2),
+        'theta': theta,
+        'rho': rho,
+        'difference': difference,
+        'se': se,
+        'p_value': p_value,
+        'ci_lower': difference - t_critical * se,
+        'ci_upper': difference + t_critical * se,
+        'adjusted_difference': adjusted,
+        'adjusted_se': se_adjusted,
+        'adjusted_p_value': p_adjusted,
+        'adjusted_ci_lower': adjusted - t_critical * se_adjusted,
+        'adjusted_ci_upper': adjusted + t_critical * se_adjusted,
+        'variance_reduction': 1 - se_adjusted ** 2 / se ** 2,
+    }
+
+
+def summary(revenue_stats, confidence=0.95):
+    """``estimate`` for the overall effect and each segment, one row each."""
+    segments = [s for s in SEGMENT_LABELS if s in revenue_stats.table.index.get_level_values('segment')]
+    rows = {'Overall': estimate(revenue_stats, None, confidence)}
+    rows.update({segment: estimate(revenue_stats, segment, confidence) for segment in segments})
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CUPED-adjusted treatment effect on final revenue")
+    parser.add_argument('--mde-pct', type=float, default=5.0, help="minimum detectable effect, %% of baseline")
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--power', type=float, default=0.80)
+    args = parser.parse_args()
+
+    results = load_processed('experiment_results',
+                             columns=['group', 'total_price', 'total_shipping', 'order_total', 'final_price'])
+    table = summary(cuped_stats(results))
+    print(table[['theta', 'rho', 'difference', 'ci_lower', 'ci_upper', 'adjusted_difference',
+                 'adjusted_ci_lower', 'adjusted_ci_upper', 'adjusted_p_value',
+                 'variance_reduction']].round(4).to_string())
+
+    # Sample size for the design MDE, as in experiment_design, with and without CUPED
+    order_totals = load_processed('order_totals', columns=['order_total'])['order_total']
+    std, mde = order_totals.std(), order_totals.mean() * args.mde_pct / 100
+    rho = table.loc['Overall', 'rho']
+    plain, cuped = sample_size(mde, std, args.alpha, args.power, variance_factor=np.array([1.0, 1 - rho ** 2]))
+    print(f"\nOrders per arm for a {args.mde_pct:g}% MDE ({mde:.2f} BRL): "
+          f"{plain:,} unadjusted, {cuped:,} with CUPED (rho = {rho:.3f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Cached loading of the raw Olist CSV files.
+
+Each file in data/raw is parsed once and stored as a compressed Parquet copy
+under data/cache, keyed by the SHA-256 of the source CSV. Later loads read
+the Parquet copy and only the requested columns. If the source CSV changes,
+its hash changes and the cache entry is rebuilt on the next load.
+
+``load_raw`` returns the tables exactly as ``pd.read_csv`` infers them.
+``load_table`` applies the declared schema from ``src.schema`` (categories,
+parsed timestamps, narrowed numerics) to the raw table and caches the typed
+version.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from .schema import SCHEMA_VERSION, apply_schema, memory_report
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:  # Parquet caching is skipped without pyarrow
+    pyarrow = None
+
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+RAW_DIR = ROOT_DIR / 'data' / 'raw'
+CACHE_DIR = ROOT_DIR / 'data' / 'cache'
+
+# Short table names used throughout the notebooks -> raw file names
+RAW_FILES = {
+    'customers': 'olist_customers_dataset.csv',
+    'geolocation': 'olist_geolocation_dataset.csv',
+    'order_items': 'olist_order_items_dataset.csv',
+    'order_payments': 'olist_order_payments_dataset.csv',
+    'order_reviews': 'olist_order_reviews_dataset.csv',
+    'orders': 'olist_orders_dataset.csv',
+    'products': 'olist_products_dataset.csv',
+    'sellers': 'olist_sellers_dataset.csv',
+    'category_translation': 'product_category_name_translation.csv',
+}
+
+_MANIFEST = 'manifest.json'
+
+
+def raw_path(name):
+    """Return the path of a raw CSV given its short table name."""
+    if name not in RAW_FILES:
+        raise KeyError(f"Unknown table '{name}'. Expected one of: {sorted(RAW_FILES)}")
+    return RAW_DIR / RAW_FILES[name]
+
+
+def _read_manifest():
+    path = CACHE_DIR / _MANIFEST
+    if path.exists():
+        return json.loads(path.read_text())
+    return {}
+
+
+def _write_manifest(manifest):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Write a sibling file and rename it, so readers never see a partial manifest
+    tmp = CACHE_DIR / f'{_MANIFEST}.{os.getpid()}.tmp'
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+    os.replace(tmp, CACHE_DIR / _MANIFEST)
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file's content.
+
+    Digests are remembered in the cache manifest against the file's size and
+    modification time, so an unchanged file is only hashed once.
+    """
+    path = Path(path)
+    stat = path.stat()
+    stamp = [stat.st_size, stat.st_mtime_ns]
+
+    manifest = _read_manifest()
+    entry = manifest.get(str(path))
+    if entry is not None and entry['stamp'] == stamp:
+        return entry['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    sha256 = digest.hexdigest()
+
+    manifest[str(path)] = {'stamp': stamp, 'sha256': sha256}
+    _write_manifest(manifest)
+    return sha256
+
+
+def _cache_kind(typed):
+    return f'typed{SCHEMA_VERSION}' if typed else 'raw'
+
+
+def cache_path(name, typed=False):
+    """Parquet cache location for the current content of a raw table."""
+    digest = file_digest(raw_path(name))[:16]
+    return CACHE_DIR / f"{name}.{_cache_kind(typed)}.{digest}.parquet"
+
+
+def store_cache(name, df, typed=False):
+    """Write an already-parsed table to its cache location (None without pyarrow)."""
+    if pyarrow is None:
+        return None
+    target = cache_path(name, typed=typed)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Remove stale copies built from older versions of the same file
+    for old in CACHE_DIR.glob(f'{name}.{_cache_kind(typed)}.*.parquet'):
+        old.unlink()
+
+    tmp = target.with_suffix('.tmp')
+    df.to_parquet(tmp, index=False, compression='zstd')
+    tmp.replace(target)
+    return target
+
+
+def _build_cache(name, typed=False):
+    if typed:
+        # Typed from the raw load (its cache, if built) instead of a second CSV parse
+        df = apply_schema(load_raw(name), name)
+    else:
+        df = pd.read_csv(raw_path(name))
+    store_cache(name, df, typed=typed)
+    return df
+
+
+def load_raw(name, columns=None, use_cache=True):
+    """Load a raw Olist table.
+
+    The first call for a given file content parses the CSV and writes the
+    Parquet cache; later calls read from the cache. ``columns`` restricts the
+    load to a subset of columns (read from Parquet without touching the rest).
+    """
+    if not use_cache or pyarrow is None:
+        return pd.read_csv(raw_path(name), usecols=columns)
+
+    target = cache_path(name)
+    if target.exists():
+        return pd.read_parquet(target, columns=columns)
+
+    df = _build_cache(name)
+    return df[columns] if columns is not None else df
+
+
+def load_table(name, columns=None, use_cache=True, report=False):
+    """Load a raw Olist table with its declared schema applied.
+
+    With ``report=True`` the memory of the inferred (``load_raw``) and typed
+    versions is printed for comparison.
+    """
+    if not use_cache or pyarrow is None:
+        df = apply_schema(pd.read_csv(raw_path(name), usecols=columns), name)
+    else:
+        target = cache_path(name, typed=True)
+        if target.exists():
+            df = pd.read_parquet(target, columns=columns)
+        else:
+            df = _build_cache(name, typed=True)
+            if columns is not None:
+                df = df[columns]
+
+    if report:
+        memory_report(load_raw(name, columns=columns, use_cache=use_cache), df, name)
+    return df
+
+
+def warm_cache(names=None):
+    """Build the cache for every raw table (or the given subset)."""
+    if pyarrow is None:
+        print("pyarrow not installed - raw tables will be read from CSV")
+        return
+
+    for name in names or RAW_FILES:
+        for typed in (False, True):
+            target = cache_path(name, typed=typed)
+            if not target.exists():
+                _build_cache(name, typed=typed)
+            print(f"{name}: {target.name}")
+
+
+if __name__ == '__main__':
+    warm_cache()
@@ -0,0 +1,24 @@
+"""Experiment design from experiment_design.ipynb: sample and split orders.
+
+Both steps take an explicit random state (a ``Generator`` from ``src.rng``
+or a ``RandomState``) rather than reading the global NumPy state.
+"""
+
+GROUPS = ['control', 'treatment']
+
+
+def select_orders(order_totals, n, random_state):
+    """Random sample of ``n`` orders for the experiment."""
+    return order_totals.sample(n=n, random_state=random_state)
+
+
+def assign_groups(n, random_state, p=(0.5, 0.5)):
+    """Independent control / treatment draw for each of ``n`` orders."""
+    return random_state.choice(GROUPS, size=n, p=list(p))
+
+
+def design_experiment(order_totals, n, sample_state, assignment_state, p=(0.5, 0.5)):
+    """Select ``n`` orders and add a ``group`` column."""
+    experiment_orders = select_orders(order_totals, n, sample_state)
+    experiment_orders['group'] = assign_groups(len(experiment_orders), assignment_state, p)
+    return experiment_orders
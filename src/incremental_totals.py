@@ -0,0 +1,241 @@
+"""Incremental refresh of order_totals for appended or changed order_items.
+
+Instead of rebuilding order_totals from all of order_items, a refresh takes
+the item ledger and order_totals it was built from and a delta of new or
+changed order_items rows (matched on order_id + order_item_id). Only the
+orders touched by the delta are recomputed, from their ledger rows, so they
+come out exactly as a full rebuild would produce them.
+
+The state is range-partitioned by the first ``PREFIX_LEN`` characters of
+order_id (256 partitions for hex ids), as in ``src.chunked_totals``. Folding
+a delta reads and rewrites only the partitions it touches, so its cost
+grows with the delta and the size of those partitions, not with the
+history. Publishing data/processed/order_totals (CSV and column artifact)
+still concatenates every partition, so the CLI publishes once after folding
+all the deltas it was given.
+
+State lives in data/cache/order_totals_state:
+    items/<prefix>.parquet   item ledger partition, sorted by order_id, order_item_id
+    totals/<prefix>.parquet  order_totals partition, sorted by order_id
+    watermark.json           delta batches already folded in (by content hash)
+
+Delta items are assumed to belong to known orders; the orders-table filter
+of the full build is not re-applied.
+"""
+import argparse
+import json
+import shutil
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from .data_loader import CACHE_DIR, file_digest, load_table
+from .order_totals import ORDER_TOTALS_COLUMNS, aggregate_order_totals, reduce_sorted, write_order_totals
+from .schema import widen_money
+
+
+STATE_DIR = CACHE_DIR / 'order_totals_state'
+
+PREFIX_LEN = 2
+
+ITEM_COLUMNS = ['order_id', 'order_item_id', 'price', 'freight_value']
+
+
+def _prepare_items(items):
+    items = items[ITEM_COLUMNS].copy()
+    items['order_id'] = items['order_id'].astype(str)
+    items['order_item_id'] = items['order_item_id'].astype(np.int64)
+    for col in ['price', 'freight_value']:
+        items[col] = widen_money(items[col]) if items[col].dtype == np.float32 else items[col].astype(np.float64)
+    items = items.drop_duplicates(['order_id', 'order_item_id'], keep='last')
+    return items.sort_values(['order_id', 'order_item_id'], kind='stable').reset_index(drop=True)
+
+
+def _ranges(sorted_ids, wanted):
+    """Positions of every row of ``sorted_ids`` whose id is in ``wanted``."""
+    lo = np.searchsorted(sorted_ids, wanted, side='left')
+    hi = np.searchsorted(sorted_ids, wanted, side='right')
+    counts = hi - lo
+    if counts.sum() == 0:
+        return np.empty(0, dtype=np.intp)
+    # Expand each [lo, hi) range without a Python loop
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(lo, counts) + offsets
+
+
+def _upsert_sorted(frame, positions, rows, key_columns):
+    """Remove ``positions`` from a key-sorted frame and insert sorted ``rows``."""
+    kept = frame.drop(index=frame.index[positions]).reset_index(drop=True)
+    kept_keys = kept[key_columns[0]].to_numpy()
+    where = np.searchsorted(kept_keys, rows[key_columns[0]].to_numpy(), side='left')
+    return pd.DataFrame({
+        col: np.insert(kept[col].to_numpy(), where, rows[col].to_numpy())
+        for col in frame.columns
+    })
+
+
+def refresh_order_totals(order_totals, items, delta):
+    """Fold a delta of order_items rows into order_totals.
+
+    ``order_totals`` and ``items`` are the previous state (sorted by
+    order_id, as built by ``init_state``). Returns the updated
+    (order_totals, items).
+    """
+    delta = _prepare_items(delta)
+    if delta.empty:
+        return order_totals, items
+
+    affected = delta['order_id'].unique()
+
+    # Old ledger rows of the affected orders, overridden by the delta
+    old_positions = _ranges(items['order_id'].to_numpy(), affected)
+    touched = pd.concat([items.iloc[old_positions], delta], ignore_index=True)
+    touched = _prepare_items(touched)
+    items = _upsert_sorted(items, old_positions, touched, ['order_id'])
+
+    # Recompute only the affected orders
+    keys, total_price, total_shipping, num_items = reduce_sorted(
+        touched['order_id'].to_numpy(),
+        touched['price'].to_numpy(),
+        touched['freight_value'].to_numpy(),
+    )
+    changed = pd.DataFrame({
+        'order_id': keys,
+        'total_price': total_price,
+        'total_shipping': total_shipping,
+        'num_items': num_items,
+        'order_total': total_price + total_shipping,
+    })
+
+    old_rows = _ranges(order_totals['order_id'].to_numpy(), keys)
+    order_totals = _upsert_sorted(order_totals[ORDER_TOTALS_COLUMNS], old_rows, changed, ['order_id'])
+    return order_totals, items
+
+
+def _prefixes(order_ids, prefix_len=PREFIX_LEN):
+    return pd.Series(order_ids, dtype=str).str[:prefix_len].to_numpy()
+
+
+def _partition_path(state_dir, kind, prefix):
+    # Hex-encode so any id characters give a safe file name
+    return state_dir / kind / f'{prefix.encode().hex()}.parquet'
+
+
+def _read_partition(state_dir, kind, prefix, columns):
+    path = _partition_path(state_dir, kind, prefix)
+    if path.exists():
+        return pd.read_parquet(path)
+    return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in columns.items()})
+
+
+def _write_partition(state_dir, kind, prefix, frame):
+    path = _partition_path(state_dir, kind, prefix)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    frame.to_parquet(tmp, index=False)
+    tmp.replace(path)
+
+
+def _read_watermark(state_dir):
+    return json.loads((state_dir / 'watermark.json').read_text())
+
+
+def _write_watermark(state_dir, watermark):
+    tmp = state_dir / 'watermark.json.tmp'
+    tmp.write_text(json.dumps(watermark, indent=1))
+    tmp.replace(state_dir / 'watermark.json')
+
+
+_ITEM_DTYPES = {'order_id': object, 'order_item_id': np.int64, 'price': np.float64, 'freight_value': np.float64}
+_TOTAL_DTYPES = {'order_id': object, 'total_price': np.float64, 'total_shipping': np.float64,
+                 'num_items': np.int64, 'order_total': np.float64}
+
+
+def init_state(state_dir=STATE_DIR):
+    """Seed the incremental state from a full build over the raw tables."""
+    items = _prepare_items(load_table('order_items', columns=ITEM_COLUMNS))
+    order_totals = aggregate_order_totals(items, load_table('orders', columns=['order_id']))
+    items = items[items['order_id'].isin(order_totals['order_id'])].reset_index(drop=True)
+
+    if state_dir.exists():
+        shutil.rmtree(state_dir)
+    for kind, frame in (('items', items), ('totals', order_totals)):
+        for prefix, part in frame.groupby(_prefixes(frame['order_id']), sort=False):
+            _write_partition(state_dir, kind, prefix, part.reset_index(drop=True))
+
+    _write_watermark(state_dir, {'items_folded': len(items), 'batches': []})
+    print(f"Initialised state with {len(order_totals):,} orders ({len(items):,} items)")
+    return order_totals
+
+
+def fold_delta(delta_path, state_dir=STATE_DIR):
+    """Fold a delta CSV into the partitions it touches; returns the number of rows folded.
+
+    A delta file whose content was already folded in is skipped.
+    """
+    digest = file_digest(delta_path)
+    watermark = _read_watermark(state_dir)
+    if any(batch['sha256'] == digest for batch in watermark['batches']):
+        print(f"{delta_path}: already folded in, skipping")
+        return 0
+
+    delta = pd.read_csv(delta_path, usecols=ITEM_COLUMNS, dtype={'order_id': str})
+    items_change = 0
+    for prefix, part in delta.groupby(_prefixes(delta['order_id']), sort=True):
+        items = _read_partition(state_dir, 'items', prefix, _ITEM_DTYPES)
+        order_totals = _read_partition(state_dir, 'totals', prefix, _TOTAL_DTYPES)
+        before = len(items)
+        order_totals, items = refresh_order_totals(order_totals, items, part)
+        items_change += len(items) - before
+        _write_partition(state_dir, 'items', prefix, items)
+        _write_partition(state_dir, 'totals', prefix, order_totals)
+
+    watermark['items_folded'] += items_change
+    watermark['batches'].append({
+        'file': str(delta_path),
+        'sha256': digest,
+        'rows': len(delta),
+        'folded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    })
+    _write_watermark(state_dir, watermark)
+    print(f"Folded {len(delta):,} rows from {delta_path}")
+    return len(delta)
+
+
+def current_order_totals(state_dir=STATE_DIR):
+    """order_totals assembled from every partition, in order_id order."""
+    paths = sorted((state_dir / 'totals').glob('*.parquet'), key=lambda p: bytes.fromhex(p.stem))
+    return pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)[ORDER_TOTALS_COLUMNS]
+
+
+def publish(state_dir=STATE_DIR, output=None):
+    """Write the current order_totals (default: data/processed, CSV and artifact)."""
+    order_totals = current_order_totals(state_dir)
+    path = write_order_totals(order_totals, output)
+    print(f"Saved {len(order_totals):,} orders to {path}")
+    return order_totals
+
+
+def refresh_from_file(delta_path, state_dir=STATE_DIR, output=None):
+    """Fold one delta CSV and publish order_totals."""
+    fold_delta(delta_path, state_dir)
+    return publish(state_dir, output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental order_totals refresh")
+    parser.add_argument('delta', nargs='*', help="CSV files of new or changed order_items rows")
+    parser.add_argument('--init', action='store_true', help="rebuild the state from data/raw first")
+    parser.add_argument('--output', help="order_totals output path (default data/processed/order_totals.csv)")
+    args = parser.parse_args()
+
+    if args.init or not (STATE_DIR / 'watermark.json').exists() or not (STATE_DIR / 'totals').exists():
+        init_state()
+    folded = sum(fold_delta(path) for path in args.delta)
+    if folded or args.init:
+        publish(output=args.output)
+
+
+if __name__ == '__main__':
+    main()
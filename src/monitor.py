@@ -0,0 +1,211 @@
+"""Online A/B monitor for the free shipping test.
+
+``OnlineMonitor`` consumes order events ``(group, total_price, shipping,
+final_price)`` as they happen and keeps Welford running moments (n, mean,
+M2, min, max) of final_revenue per group, overall and per order-size
+segment. final_revenue and the segment are derived from the event the
+same way treatment_assignment and analysis do (free shipping for treatment
+orders at or above the threshold; segment by the original product price,
+total_price).
+
+``update`` is O(1) pure Python per event. ``update_batch`` folds a whole
+array of events at once by computing each cell's moments with
+``np.bincount`` and merging them (Chan's update). ``result`` returns the
+current t-statistic, p-value, CI and Cohen's d, computed from the moments
+alone (``src.sufficient_stats.compare_moments``).
+
+    python -m src.monitor                     # replay per event and check against analysis
+    python -m src.monitor --batch-size 1000   # replay in batches
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .artifacts import PROCESSED_DIR
+from .design import GROUPS
+from .simulation import SEGMENT_BINS, SEGMENT_LABELS, THRESHOLD, segment_codes
+from .sufficient_stats import STAT_COLUMNS, SufficientStats, compare_moments, merge_moments
+
+
+EVENT_COLUMNS = ['group', 'total_price', 'total_shipping', 'final_price']
+
+N_SEGMENTS = len(SEGMENT_LABELS)
+
+# Cell layout per group: one slot per segment, then the group's overall slot
+STRIDE = N_SEGMENTS + 1
+
+
+class OnlineMonitor:
+    """Running final_revenue moments per group and segment."""
+
+    def __init__(self, threshold=THRESHOLD):
+        self.threshold = threshold
+        self._group_index = {group: i for i, group in enumerate(GROUPS)}
+        n_cells = len(GROUPS) * STRIDE
+        self.n = [0] * n_cells
+        self.mean = [0.0] * n_cells
+        self.m2 = [0.0] * n_cells
+        self.min = [np.inf] * n_cells
+        self.max = [-np.inf] * n_cells
+
+    def _push(self, cell, x):
+        n = self.n[cell] + 1
+        delta = x - self.mean[cell]
+        mean = self.mean[cell] + delta / n
+        self.n[cell] = n
+        self.mean[cell] = mean
+        self.m2[cell] += delta * (x - mean)
+        if x < self.min[cell]:
+            self.min[cell] = x
+        if x > self.max[cell]:
+            self.max[cell] = x
+
+    def update(self, group, total_price, shipping, final_price):
+        """Fold in one order event."""
+        g = self._group_index[group]
+        if g == 1 and final_price >= self.threshold:
+            revenue = final_price  # treatment order with free shipping
+        else:
+            revenue = final_price + shipping
+
+        base = g * STRIDE
+        self._push(base + N_SEGMENTS, revenue)
+
+        if total_price > SEGMENT_BINS[0]:
+            segment = 0 if total_price <= SEGMENT_BINS[1] else 1 if total_price <= SEGMENT_BINS[2] else 2
+            self._push(base + segment, revenue)
+
+    def update_batch(self, groups, total_prices, shippings, final_prices):
+        """Fold in arrays of events at once."""
+        groups = np.asarray(pd.Series(groups).map(self._group_index), dtype=np.int64)
+        shippings = np.asarray(shippings, dtype=np.float64)
+        final_prices = np.asarray(final_prices, dtype=np.float64)
+        segments = segment_codes(total_prices)
+
+        free_shipping = (groups == 1) & (final_prices >= self.threshold)
+        revenue = np.where(free_shipping, final_prices, final_prices + shippings)
+
+        # Each event counts in its group's overall cell and, if binned, its segment cell
+        overall = groups * STRIDE + N_SEGMENTS
+        binned = segments >= 0
+        cells = np.concatenate([overall, (groups * STRIDE + segments)[binned]])
+        values = np.concatenate([revenue, revenue[binned]])
+
+        n_cells = len(self.n)
+        n = np.bincount(cells, minlength=n_cells)
+        safe_n = np.maximum(n, 1)
+        mean = np.bincount(cells, weights=values, minlength=n_cells) / safe_n
+        m2 = np.bincount(cells, weights=(values - mean[cells]) ** 2, minlength=n_cells)
+        low = np.full(n_cells, np.inf)
+        high = np.full(n_cells, -np.inf)
+        np.minimum.at(low, cells, values)
+        np.maximum.at(high, cells, values)
+
+        current = {name: np.asarray(getattr(self, name)) for name in STAT_COLUMNS}
+        merged = merge_moments(current, {'n': n, 'mean': mean, 'm2': m2, 'min': low, 'max': high})
+        for name in STAT_COLUMNS:
+            setattr(self, name, merged[name].tolist())
+
+    def cell(self, group, segment=None):
+        """Moments of one group, overall or in one segment."""
+        slot = N_SEGMENTS if segment is None else SEGMENT_LABELS.index(segment)
+        cell = self._group_index[group] * STRIDE + slot
+        return {name: getattr(self, name)[cell] for name in STAT_COLUMNS}
+
+    def result(self, segment=None, confidence=0.95):
+        """Current treatment vs control t-test, CI and Cohen's d."""
+        control, treatment = GROUPS
+        return compare_moments(self.cell(control, segment), self.cell(treatment, segment), confidence)
+
+    def to_sufficient_stats(self):
+        """Per-segment moments as a ``SufficientStats`` (to merge with other sources)."""
+        index = pd.MultiIndex.from_product([GROUPS, SEGMENT_LABELS], names=['group', 'segment'])
+        table = pd.DataFrame([self.cell(g, s) for g, s in index], index=index)[STAT_COLUMNS]
+        return SufficientStats(table[table['n'] > 0])
+
+
+def analysis_reference(experiment_results):
+    """Overall and segment statistics computed the way analysis.ipynb does."""
+    reference = {}
+    segments = pd.cut(experiment_results['total_price'], bins=SEGMENT_BINS, labels=SEGMENT_LABELS)
+    for segment in [None] + SEGMENT_LABELS:
+        data = experiment_results if segment is None else experiment_results[segments == segment]
+        control = data[data['group'] == 'control']['final_revenue']
+        treatment = data[data['group'] == 'treatment']['final_revenue']
+
+        n1, n2 = len(control), len(treatment)
+        s1, s2 = control.std(), treatment.std()
+        mean_diff = treatment.mean() - control.mean()
+        t_statistic, p_value = stats.ttest_ind(treatment, control)
+        se_diff = np.sqrt((s1**2 / n1) + (s2**2 / n2))
+        t_critical = stats.t.ppf(0.975, min(n1 - 1, n2 - 1))
+        pooled_std = np.sqrt(((n1 - 1) * s1**2 + (n2 - 1) * s2**2) / (n1 + n2 - 2))
+
+        reference[segment or 'Overall'] = {
+            'n_control': n1, 'n_treatment': n2,
+            'control_mean': control.mean(), 'treatment_mean': treatment.mean(),
+            'difference': mean_diff, 't_statistic': t_statistic, 'p_value': p_value,
+            'ci_lower': mean_diff - t_critical * se_diff, 'ci_upper': mean_diff + t_critical * se_diff,
+            'cohens_d': mean_diff / pooled_std,
+        }
+    return pd.DataFrame.from_dict(reference, orient='index')
+
+
+def replay(path=None, batch_size=None, threshold=THRESHOLD):
+    """Feed experiment_results through a monitor and compare with analysis.
+
+    Returns (monitor, comparison DataFrame, events per second).
+    """
+    path = path or PROCESSED_DIR / 'experiment_results.csv'
+    experiment_results = pd.read_csv(path)
+    events = experiment_results[EVENT_COLUMNS]
+
+    monitor = OnlineMonitor(threshold)
+    start = time.perf_counter()
+    if batch_size:
+        for i in range(0, len(events), batch_size):
+            batch = events.iloc[i:i + batch_size]
+            monitor.update_batch(*(batch[col].to_numpy() for col in EVENT_COLUMNS))
+    else:
+        update = monitor.update
+        for event in zip(*(events[col].tolist() for col in EVENT_COLUMNS)):
+            update(*event)
+    rate = len(events) / (time.perf_counter() - start)
+
+    reference = analysis_reference(experiment_results)
+    online = pd.DataFrame.from_dict(
+        {name: monitor.result(None if name == 'Overall' else name) for name in reference.index},
+        orient='index')[reference.columns]
+    comparison = pd.concat({'analysis': reference, 'online': online}, axis=1)
+    return monitor, comparison, rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay experiment_results through the online monitor")
+    parser.add_argument('--path', help="experiment_results CSV (default data/processed)")
+    parser.add_argument('--batch-size', type=int, help="fold events in batches of this size")
+    args = parser.parse_args()
+
+    monitor, comparison, rate = replay(args.path, args.batch_size)
+    print(f"Replayed {sum(monitor.n[N_SEGMENTS::STRIDE]):,} events "
+          f"at {rate:,.0f} events/s\n")
+
+    reference, online = comparison['analysis'], comparison['online']
+    print(online[['difference', 'p_value', 'ci_lower', 'ci_upper', 'cohens_d']].to_string())
+
+    # analysis.ipynb reports differences and CIs to 2 decimals, p-values and d to 4
+    rounded = {'difference': 2, 'ci_lower': 2, 'ci_upper': 2, 'p_value': 4, 't_statistic': 4, 'cohens_d': 4}
+    counts_match = (reference[['n_control', 'n_treatment']] == online[['n_control', 'n_treatment']]).all().all()
+    shown_match = all((reference[col].round(d) == online[col].round(d)).all() for col, d in rounded.items())
+    numeric = [c for c in reference.columns if c not in ('n_control', 'n_treatment')]
+    max_rel = ((online[numeric] - reference[numeric]).abs() / reference[numeric].abs().clip(lower=1e-300)).max().max()
+    print(f"\nCounts match analysis: {counts_match}")
+    print(f"Reported values match analysis: {shown_match}")
+    print(f"Largest relative difference: {max_rel:.1e}")
+
+
+if __name__ == '__main__':
+    main()
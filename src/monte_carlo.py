@@ -0,0 +1,222 @@
+"""Monte Carlo replicates of the treatment simulation.
+
+treatment_assignment.ipynb draws one set of responders. Here the responder
+draw and the final_revenue computation are repeated for many independent
+replicates to get the sampling distribution of the treatment effect
+(difference in mean final_revenue, treatment - control) overall and per
+order-size segment.
+
+Only eligible treatment orders (below the threshold) change between
+replicates; every other order's revenue is fixed. So each replicate is
+the fixed per-segment revenue sums plus the revenue gained by its
+responders. Replicates are processed in blocks as 2-D
+replicates x eligible-orders arrays: responders are the ``k`` smallest of
+one uniform key per order (``argpartition`` along each row), which gives
+``k`` distinct orders uniformly at random per replicate, the same as
+``choice(replace=False)``. ``max_block_mb`` bounds the size of a block.
+Each replicate has its own random streams (``src.rng``), so ranges of
+replicates can run in parallel processes with identical results.
+
+    python -m src.monte_carlo --replicates 10000
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .artifacts import load_processed
+from .rng import SEED, streams
+from .simulation import (EFFECT_COLUMNS, MAX_ADDITION, MIN_ADDITION, RESPONSE_RATE, SEGMENT_LABELS,
+                         THRESHOLD, compute_final_revenue, segment_codes)
+
+
+def _fixed_sums(revenue, mask, segments):
+    """Total revenue and order count, overall and per segment, of ``mask`` orders."""
+    n_segments = len(SEGMENT_LABELS)
+    in_segment = mask & (segments >= 0)
+    sums = np.bincount(segments[in_segment], weights=revenue[in_segment], minlength=n_segments)
+    counts = np.bincount(segments[in_segment], minlength=n_segments)
+    return revenue[mask].sum(), mask.sum(), sums, counts
+
+
+def block_effects(gains, gain_segments, treatment, control):
+    """Effects for a block of replicates from each responder's revenue gain.
+
+    ``gains`` and ``gain_segments`` are (replicates, responders) arrays;
+    ``treatment`` / ``control`` are the ``_fixed_sums`` of each group.
+    """
+    t_total, t_count, t_sums, t_counts = treatment
+    c_total, c_count, c_sums, c_counts = control
+
+    effects = np.empty((len(gains), len(EFFECT_COLUMNS)))
+    effects[:, 0] = (t_total + gains.sum(axis=1)) / t_count - c_total / c_count
+    for s in range(len(SEGMENT_LABELS)):
+        segment_gain = np.where(gain_segments == s, gains, 0.0).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            effects[:, s + 1] = (t_sums[s] + segment_gain) / t_counts[s] - c_sums[s] / c_counts[s]
+    return effects
+
+
+def _context(experiment_design, threshold):
+    """Fixed revenue sums and the eligible orders' arrays for the replicates."""
+    price = experiment_design['total_price'].to_numpy(dtype=np.float64)
+    shipping = experiment_design['total_shipping'].to_numpy(dtype=np.float64)
+    treated = (experiment_design['group'] == 'treatment').to_numpy()
+    segments = segment_codes(price)
+
+    # Revenue with no responders; treatment orders at the threshold ship free
+    base_revenue = np.where(treated & (price >= threshold), price, price + shipping)
+    eligible = np.flatnonzero(treated & (price < threshold))
+    return {
+        'treatment': _fixed_sums(base_revenue, treated, segments),
+        'control': _fixed_sums(base_revenue, ~treated, segments),
+        'price': price[eligible],
+        'shipping': shipping[eligible],
+        'segments': segments[eligible],
+    }
+
+
+def _simulate_range(context, start, stop, seed, k, extra_range, threshold, block_size):
+    """Effects of replicates ``start`` .. ``stop - 1``, one block at a time."""
+    n_eligible = len(context['price'])
+    effects = np.empty((stop - start, len(EFFECT_COLUMNS)))
+
+    # Per-responder work arrays, allocated once and reused by every block
+    rows = min(block_size, stop - start)
+    price, shipping, work, extras = (np.empty((rows, k)) for _ in range(4))
+    keys = np.empty((rows, n_eligible)) if 0 < k < n_eligible else None
+
+    for block_start in range(start, stop, block_size):
+        block_stop = min(block_start + block_size, stop)
+        size = block_stop - block_start
+
+        # Row r of the block draws from replicate r's own streams, straight into the buffers
+        if keys is not None:
+            for row, rng in zip(keys, streams(seed, 'responders', block_start, block_stop)):
+                rng.random(out=row)
+            responders = np.argpartition(keys[:size], k - 1, axis=1)[:, :k]
+        else:
+            responders = np.broadcast_to(np.arange(k), (size, k))
+        # uniform(0, extra_range) is extra_range * random(), bit for bit
+        extra = extras[:size]
+        for row, rng in zip(extra, streams(seed, 'extras', block_start, block_stop)):
+            rng.random(out=row)
+        extra *= extra_range
+
+        p = np.take(context['price'], responders, out=price[:size])
+        s = np.take(context['shipping'], responders, out=shipping[:size])
+        # final_price = p + ((threshold - p) + extra), then shipping below the
+        # threshold, minus the original revenue; same operations as before
+        gains = np.subtract(threshold, p, out=work[:size])
+        gains += extra
+        gains += p
+        np.add(gains, s, out=gains, where=gains < threshold)
+        gains -= np.add(p, s, out=p)
+
+        effects[block_start - start:block_stop - start] = block_effects(
+            gains, context['segments'][responders], context['treatment'], context['control'])
+    return effects
+
+
+def run_replicates(experiment_design, n_replicates=1000, response_rate=RESPONSE_RATE,
+                   min_addition=MIN_ADDITION, max_addition=MAX_ADDITION, threshold=THRESHOLD,
+                   seed=SEED, max_block_mb=256, processes=1):
+    """Simulate ``n_replicates`` responder draws and return their effects.
+
+    ``experiment_design`` needs total_price, total_shipping and group.
+    Replicate ``r`` draws from the ``src.rng`` responders / extras streams
+    keyed by ``r``, so the result does not depend on ``max_block_mb`` or
+    ``processes``. Returns a DataFrame with one row per replicate and columns
+    ``EFFECT_COLUMNS`` (BRL difference in mean final_revenue).
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    context = _context(experiment_design, threshold)
+    n_eligible = len(context['price'])
+    k = int(n_eligible * response_rate)
+
+    # keys + argpartition indices per eligible order, then ~5 arrays per responder
+    bytes_per_replicate = 16 * n_eligible + 40 * k + 8
+    block_size = max(1, int(max_block_mb * 2**20 // bytes_per_replicate))
+    args = (seed, k, max_addition - min_addition, threshold, block_size)
+
+    bounds = np.linspace(0, n_replicates, max(1, min(processes, n_replicates)) + 1).astype(int)
+    if len(bounds) == 2:
+        effects = _simulate_range(context, 0, n_replicates, *args)
+    else:
+        effects = np.empty((n_replicates, len(EFFECT_COLUMNS)))
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = {pool.submit(_simulate_range, context, start, stop, *args): start
+                       for start, stop in zip(bounds[:-1], bounds[1:])}
+            for future, start in futures.items():
+                result = future.result()
+                effects[start:start + len(result)] = result
+    return pd.DataFrame(effects, columns=EFFECT_COLUMNS)
+
+
+def observed_effects(experiment_results, threshold=THRESHOLD):
+    """Effects of the single realization in experiment_results."""
+    revenue = compute_final_revenue(experiment_results, threshold)
+    treated = (experiment_results['group'] == 'treatment').to_numpy()
+    segments = segment_codes(experiment_results['total_price'])
+
+    observed = {'overall': revenue[treated].mean() - revenue[~treated].mean()}
+    for s, label in enumerate(SEGMENT_LABELS):
+        in_segment = segments == s
+        observed[label] = revenue[treated & in_segment].mean() - revenue[~treated & in_segment].mean()
+    return pd.Series(observed)
+
+
+def summarize_effects(effects, observed=None):
+    """Mean, spread and 95% interval of each effect across replicates.
+
+    With ``observed`` (e.g. from ``observed_effects``), also the share of
+    replicates at or below the observed value.
+    """
+    summary = pd.DataFrame({
+        'mean': effects.mean(),
+        'std': effects.std(ddof=1),
+        'p2.5': effects.quantile(0.025),
+        'p50': effects.quantile(0.5),
+        'p97.5': effects.quantile(0.975),
+        'share_positive': (effects > 0).mean(),
+    })
+    if observed is not None:
+        summary['observed'] = observed
+        summary['observed_quantile'] = (effects <= observed).mean()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo replicates of the treatment simulation")
+    parser.add_argument('--replicates', type=int, default=1000)
+    parser.add_argument('--response-rate', type=float, default=RESPONSE_RATE)
+    parser.add_argument('--min-addition', type=float, default=MIN_ADDITION)
+    parser.add_argument('--max-addition', type=float, default=MAX_ADDITION)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--max-block-mb', type=int, default=256)
+    parser.add_argument('--processes', type=int, default=1)
+    args = parser.parse_args()
+
+    design = load_processed('experiment_design', columns=['total_price', 'total_shipping', 'group'])
+    start = time.perf_counter()
+    effects = run_replicates(design, args.replicates, args.response_rate, args.min_addition,
+                             args.max_addition, args.threshold, args.seed, args.max_block_mb,
+                             args.processes)
+    print(f"{args.replicates:,} replicates in {time.perf_counter() - start:.2f}s\n")
+
+    observed = None
+    settings = (args.response_rate, args.min_addition, args.max_addition, args.threshold)
+    if settings == (RESPONSE_RATE, MIN_ADDITION, MAX_ADDITION, THRESHOLD):
+        # experiment_results is the notebook's single realization at these settings
+        results = load_processed('experiment_results',
+                                 columns=['total_price', 'total_shipping', 'group', 'final_price'])
+        observed = observed_effects(results, args.threshold)
+    print(summarize_effects(effects, observed).round(3).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Order-level totals (price, shipping, item count) from order_items.
+
+Replaces the merge + ``groupby('order_id').agg(...)`` in data_exploration.
+The orders merge there only drops items whose order is unknown, so the
+aggregation works on order_items alone (optionally filtered by ``orders``).
+
+Rows are keyed by integer codes from one sorted ``pd.factorize`` over the
+distinct order ids of both tables (a categorical column from ``load_table``
+is factorized through its categories, not per row). Codes sort in order_id
+order, so the rows are sorted once by code (skipped when the input is
+already in key order), reduced segment by segment and come out in order_id
+order, as with groupby. The ``orders`` filter is a boolean lookup on the
+codes rather than an ``isin`` on strings.
+
+pandas groupby sums use Kahan (compensated) summation, so a plain
+``np.add.reduceat`` differs from the notebook output in the last bit for
+orders with three or more items. ``segment_sum`` runs the same compensated
+update vectorised across segments: one pass per item position, and orders
+have at most a few dozen items.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .artifacts import save_processed
+from .data_loader import ROOT_DIR, load_table
+from .schema import widen_money
+
+
+PROCESSED_DIR = ROOT_DIR / 'data' / 'processed'
+
+ORDER_TOTALS_COLUMNS = ['order_id', 'total_price', 'total_shipping', 'num_items', 'order_total']
+
+
+def segment_bounds(sorted_keys):
+    """Start offset of each run of equal keys in a sorted key array."""
+    sorted_keys = np.asarray(sorted_keys)
+    if len(sorted_keys) == 0:
+        return np.empty(0, dtype=np.intp)
+    return np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+
+
+def segment_sum(values, starts):
+    """Compensated sum of each segment ``values[starts[i]:starts[i + 1]]``."""
+    lengths = np.diff(np.r_[starts, len(values)])
+    total = np.zeros(len(starts))
+    compensation = np.zeros(len(starts))
+
+    for position in range(lengths.max(initial=0)):
+        active = np.flatnonzero(lengths > position)
+        y = values[starts[active] + position] - compensation[active]
+        t = total[active] + y
+        compensation[active] = (t - total[active]) - y
+        total[active] = t
+    return total
+
+
+def reduce_sorted(keys, price, shipping):
+    """Per-key sums and counts over key-sorted arrays.
+
+    Returns (unique_keys, total_price, total_shipping, num_items).
+    """
+    starts = segment_bounds(keys)
+    total_price = segment_sum(price, starts)
+    total_shipping = segment_sum(shipping, starts)
+    num_items = np.diff(np.r_[starts, len(keys)]).astype(np.int64)
+    return np.asarray(keys)[starts], total_price, total_shipping, num_items
+
+
+def _money(series):
+    # float32 columns from the typed loader are widened back to exact cents
+    if series.dtype == np.float32:
+        return widen_money(series)
+    return series.to_numpy(dtype=np.float64)
+
+
+def _distinct_ids(ids):
+    """(distinct values to factorize, codes mapping rows to them or None)."""
+    if isinstance(ids.dtype, pd.CategoricalDtype):
+        return pd.Series(ids.cat.categories), ids.cat.codes.to_numpy()
+    return ids, None
+
+
+def aggregate_order_totals(order_items, orders=None):
+    """Build the order_totals table from order_items.
+
+    ``orders`` (optional) restricts the result to order_ids present in it,
+    matching the inner merge used in data_exploration.
+    """
+    values, codes = _distinct_ids(order_items['order_id'])
+    parts = [values]
+    if orders is not None:
+        parts.append(_distinct_ids(orders['order_id'])[0])
+    # One sorted factorize over both tables: shared codes that sort like the ids
+    all_keys, uniques = pd.factorize(pd.concat(parts, ignore_index=True), sort=True)
+
+    keys = all_keys[:len(values)]
+    if codes is not None:
+        keys = keys[codes]
+    price = _money(order_items['price'])
+    shipping = _money(order_items['freight_value'])
+
+    if orders is not None:
+        known = np.zeros(len(uniques), dtype=bool)
+        known[all_keys[len(values):]] = True
+        keep = known[keys]
+        keys, price, shipping = keys[keep], price[keep], shipping[keep]
+
+    # Sort by key unless the file is already grouped in key order
+    if len(keys) and not np.all(keys[1:] >= keys[:-1]):
+        order = np.argsort(keys, kind='stable')
+        keys, price, shipping = keys[order], price[order], shipping[order]
+
+    unique_keys, total_price, total_shipping, num_items = reduce_sorted(keys, price, shipping)
+
+    return pd.DataFrame({
+        'order_id': uniques[unique_keys],
+        'total_price': total_price,
+        'total_shipping': total_shipping,
+        'num_items': num_items,
+        'order_total': total_price + total_shipping,
+    })
+
+
+def write_order_totals(order_totals, path=None):
+    """Write order_totals as CSV, or Parquet when the path ends in .parquet.
+
+    The default location goes through ``save_processed`` so the columnar
+    artifact next to it is rewritten as well.
+    """
+    path = Path(path) if path else PROCESSED_DIR / 'order_totals.csv'
+    if path == PROCESSED_DIR / 'order_totals.csv':
+        save_processed(order_totals, 'order_totals')
+    elif path.suffix == '.parquet':
+        order_totals.to_parquet(path, index=False)
+    else:
+        order_totals.to_csv(path, index=False)
+    return path
+
+
+def build_order_totals(path=None):
+    """Rebuild data/processed/order_totals.csv from the raw tables."""
+    order_items = load_table('order_items', columns=['order_id', 'price', 'freight_value'])
+    orders = load_table('orders', columns=['order_id'])
+    order_totals = aggregate_order_totals(order_items, orders)
+    path = write_order_totals(order_totals, path)
+    print(f"Saved {len(order_totals):,} orders to {path}")
+    return order_totals
+
+
+if __name__ == '__main__':
+    build_order_totals()
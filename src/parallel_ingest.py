@@ -0,0 +1,138 @@
+"""Parallel parsing of the raw Olist CSVs.
+
+Independent files are parsed concurrently in a process pool. Files larger
+than ``split_bytes`` (in practice olist_geolocation_dataset.csv) are also cut
+into up to one byte range per worker, aligned to line starts; each range is
+parsed by its own worker and the pieces are concatenated in order.
+
+Tables are parsed with their declared schema (``src.schema``), so every
+shard gets the same dtypes; categorical columns are merged with
+``union_categoricals``. Byte-range splitting assumes one record per line,
+so tables with quoted multi-line fields (the review comments) are always
+parsed whole.
+"""
+import argparse
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from .data_loader import RAW_FILES, pyarrow, raw_path, store_cache
+from .schema import read_csv_kwargs
+
+
+# Tables whose text fields may contain quoted newlines
+UNSPLITTABLE = {'order_reviews'}
+
+SPLIT_BYTES = 32 * 1024 * 1024
+
+# Smallest byte range worth handing to a worker
+MIN_SHARD_BYTES = 4 * 1024 * 1024
+
+
+def byte_ranges(path, n_shards):
+    """Split a CSV body into ``n_shards`` byte ranges starting on line boundaries.
+
+    Returns (header_bytes, [(start, end), ...]); the header line is excluded
+    from the ranges.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        body_start = f.tell()
+
+        bounds = [body_start]
+        for i in range(1, n_shards):
+            f.seek(max(body_start + (size - body_start) * i // n_shards, bounds[-1]))
+            f.readline()  # move to the start of the next full line
+            bounds.append(min(f.tell(), size))
+        bounds.append(size)
+
+    ranges = [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    return header, ranges
+
+
+def _parse_range(name, start, end):
+    path = raw_path(name)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        body = f.read(end - start)
+    return pd.read_csv(io.BytesIO(header + body), **read_csv_kwargs(name))
+
+
+def _parse_whole(name):
+    return pd.read_csv(raw_path(name), **read_csv_kwargs(name))
+
+
+def _concat_shards(shards):
+    """Concatenate shard frames, unioning categorical columns.
+
+    Categories are sorted even for a single shard, to match ``load_table``.
+    """
+    combined = {}
+    for col in shards[0].columns:
+        if isinstance(shards[0][col].dtype, pd.CategoricalDtype):
+            combined[col] = union_categoricals([s[col] for s in shards], sort_categories=True)
+        else:
+            combined[col] = pd.concat([s[col] for s in shards], ignore_index=True)
+    return pd.DataFrame(combined)
+
+
+def load_tables(names=None, processes=None, split_bytes=SPLIT_BYTES):
+    """Parse raw tables in parallel and return {name: DataFrame}."""
+    names = list(names or RAW_FILES)
+    processes = processes or os.cpu_count()
+
+    # One task per small file, one task per byte range of each large file
+    tasks = []
+    for name in names:
+        size = os.path.getsize(raw_path(name))
+        if name in UNSPLITTABLE or size <= split_bytes:
+            tasks.append((name, None))
+        else:
+            n_shards = max(1, min(processes, size // MIN_SHARD_BYTES))
+            _, ranges = byte_ranges(raw_path(name), n_shards)
+            tasks.extend((name, r) for r in ranges)
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [
+            pool.submit(_parse_whole, name) if r is None else pool.submit(_parse_range, name, *r)
+            for name, r in tasks
+        ]
+        pieces = {}
+        for (name, _), future in zip(tasks, futures):
+            pieces.setdefault(name, []).append(future.result())
+
+    return {name: _concat_shards(pieces[name]) for name in names}
+
+
+def ingest(names=None, processes=None, split_bytes=SPLIT_BYTES):
+    """Parse all raw tables in parallel and store them in the typed cache."""
+    start = time.perf_counter()
+    tables = load_tables(names, processes, split_bytes)
+    if pyarrow is None:
+        print("pyarrow not installed - tables are parsed but not cached; load_table() reads the CSVs")
+    for name, df in tables.items():
+        if pyarrow is not None:
+            store_cache(name, df, typed=True)
+        print(f"{name}: {len(df):,} rows")
+    print(f"Ingested {len(tables)} tables in {time.perf_counter() - start:.2f}s")
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel ingestion of data/raw into the typed cache")
+    parser.add_argument('names', nargs='*', help=f"tables to load (default: all of {sorted(RAW_FILES)})")
+    parser.add_argument('--processes', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('--split-mb', type=int, default=SPLIT_BYTES // (1024 * 1024),
+                        help="files larger than this are parsed in byte-range shards")
+    args = parser.parse_args()
+    ingest(args.names or None, args.processes, args.split_mb * 1024 * 1024)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Permutation tests of the mean final_revenue difference per segment.
+
+For each cell (all orders, then Small / Medium / Large) the revenue of both
+arms is pooled once. A chunk of permutations is a (permutations x orders)
+label matrix, each row a shuffle of the original treatment / control labels
+(``Generator.permuted`` along the rows). The treatment sum of every
+permutation is then one matrix-vector product, which gives the permuted
+differences in means. The p-value is two-sided with the usual +1
+correction:
+
+    p = (1 + #{|permuted difference| >= |observed|}) / (1 + permutations)
+
+Chunks for all cells run in a process pool, one round of chunks at a time.
+After each round, a cell stops once it has run ``min_permutations`` and the
+Clopper-Pearson interval of its p-value lies entirely above or below
+``alpha``. The rule is checked after every chunk in chunk order, and chunk
+``i`` of cell ``s`` always uses the ``src.rng`` stream (s, i), so results do
+not depend on the number of processes.
+
+    python -m src.permutation --permutations 100000 --processes 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .artifacts import load_processed
+from .rng import SEED, stream
+from .simulation import EFFECT_COLUMNS, compute_final_revenue, segment_codes
+from .sufficient_stats import SufficientStats
+
+
+ALPHA = 0.05
+
+CHUNK_SIZE = 500
+
+# Confidence of the interval around the p-value used for early stopping
+STOP_CONFIDENCE = 0.999
+
+# Never stop before this many permutations, so small p-values keep some resolution
+MIN_PERMUTATIONS = 10_000
+
+
+def pooled_cells(experiment_results):
+    """{cell: (pooled revenue, treatment labels)} for the overall test and each segment."""
+    revenue = compute_final_revenue(experiment_results)
+    treated = (experiment_results['group'] == 'treatment').to_numpy()
+    segments = segment_codes(experiment_results['total_price'])
+
+    cells = {'overall': (revenue, treated)}
+    for s, label in enumerate(EFFECT_COLUMNS[1:]):
+        in_segment = segments == s
+        cells[label] = (revenue[in_segment], treated[in_segment])
+    return cells
+
+
+def mean_difference(values, treated):
+    return values[treated].mean() - values[~treated].mean()
+
+
+def count_extreme(values, treated, n_permutations, seed, cell_index, chunk):
+    """Permuted differences at least as extreme as the observed one, for one chunk."""
+    rng = stream(seed, 'permutation', cell_index, chunk)
+    n_treated = int(treated.sum())
+    n_control = len(values) - n_treated
+    total = values.sum()
+    observed = abs(mean_difference(values, treated))
+
+    labels = rng.permuted(np.broadcast_to(treated.astype(np.float64), (n_permutations, len(values))), axis=1)
+    treatment_sum = labels @ values
+    permuted = treatment_sum / n_treated - (total - treatment_sum) / n_control
+    # Tolerance so ties are not lost to floating point rounding
+    return int((np.abs(permuted) >= observed * (1 - 1e-12)).sum())
+
+
+def p_value_interval(extreme, permutations, confidence=STOP_CONFIDENCE):
+    """Clopper-Pearson interval for the permutation p-value."""
+    tail = (1 - confidence) / 2
+    lower = stats.beta.ppf(tail, extreme, permutations - extreme + 1) if extreme > 0 else 0.0
+    upper = stats.beta.ppf(1 - tail, extreme + 1, permutations - extreme) if extreme < permutations else 1.0
+    return lower, upper
+
+
+def permutation_tests(experiment_results, n_permutations=100_000, alpha=ALPHA, chunk_size=CHUNK_SIZE,
+                      seed=SEED, processes=1, early_stop=True, min_permutations=MIN_PERMUTATIONS):
+    """Permutation p-value for the overall difference and each segment.
+
+    Returns a DataFrame with one row per cell, next to the t-test p-value.
+    """
+    cells = pooled_cells(experiment_results)
+    names = list(cells)
+    n_chunks = -(-n_permutations // chunk_size)
+    chunk_sizes = [min(chunk_size, n_permutations - i * chunk_size) for i in range(n_chunks)]
+
+    done = {name: {'chunks': 0, 'permutations': 0, 'extreme': 0, 'stopped_early': False} for name in names}
+    active = list(names)
+    round_size = max(1, processes)
+
+    pool = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+    try:
+        while active:
+            # Next round: up to round_size chunks of every active cell
+            tasks = [(name, chunk) for name in active
+                     for chunk in range(done[name]['chunks'], min(done[name]['chunks'] + round_size, n_chunks))]
+            args = [(*cells[name], chunk_sizes[chunk], seed, names.index(name), chunk) for name, chunk in tasks]
+            if pool:
+                counts = [f.result() for f in [pool.submit(count_extreme, *a) for a in args]]
+            else:
+                counts = [count_extreme(*a) for a in args]
+
+            # Fold chunks in order, stopping a cell at the first chunk that settles it
+            for (name, chunk), extreme in zip(tasks, counts):
+                state = done[name]
+                if name not in active:
+                    continue
+                state['chunks'] = chunk + 1
+                state['permutations'] += chunk_sizes[chunk]
+                state['extreme'] += extreme
+
+                lower, upper = p_value_interval(state['extreme'], state['permutations'])
+                settled = state['permutations'] >= min_permutations and (upper < alpha or lower > alpha)
+                if (early_stop and settled and state['chunks'] < n_chunks) or state['chunks'] == n_chunks:
+                    state['stopped_early'] = state['chunks'] < n_chunks
+                    active.remove(name)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    t_tests = SufficientStats.from_frame(
+        experiment_results.assign(final_revenue=compute_final_revenue(experiment_results))
+    ).summary()
+    # Match rows by label; a segment without orders in both groups gets NaN
+    t_tests = t_tests.rename(index={'Overall': EFFECT_COLUMNS[0]}).reindex(EFFECT_COLUMNS)
+
+    rows = {}
+    for name in names:
+        values, treated = cells[name]
+        state = done[name]
+        rows[name] = {
+            'n_control': int((~treated).sum()),
+            'n_treatment': int(treated.sum()),
+            'difference': mean_difference(values, treated),
+            'permutations': state['permutations'],
+            'extreme': state['extreme'],
+            'p_value': (1 + state['extreme']) / (1 + state['permutations']),
+            'stopped_early': state['stopped_early'],
+            't_test_p_value': t_tests.loc[name, 'p_value'],
+        }
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Permutation tests of the revenue difference per segment")
+    parser.add_argument('--permutations', type=int, default=100_000)
+    parser.add_argument('--alpha', type=float, default=ALPHA)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--min-permutations', type=int, default=MIN_PERMUTATIONS)
+    parser.add_argument('--no-early-stop', action='store_true', help="always run every permutation")
+    args = parser.parse_args()
+
+    results = load_processed('experiment_results',
+                             columns=['group', 'total_price', 'total_shipping', 'final_price'])
+    start = time.perf_counter()
+    table = permutation_tests(results, args.permutations, args.alpha, args.chunk_size, args.seed,
+                              args.processes, early_stop=not args.no_early_stop,
+                              min_permutations=args.min_permutations)
+    print(f"Finished in {time.perf_counter() - start:.2f}s\n")
+    print(table.to_string())
+
+
+if __name__ == '__main__':
+    main()
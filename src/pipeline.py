@@ -0,0 +1,251 @@
+"""Content-hash DAG runner for the six notebooks.
+
+Each stage declares the files it reads and writes, including the
+``data/processed/<name>.cols`` artifacts that ``load_processed`` actually
+reads. Its cache key is a hash
+of the content of its inputs, its code (the notebook's code cells plus the
+``src`` modules it imports) and its parameters. A stage is skipped when its
+key matches the one recorded at its last successful run and all its outputs
+exist. Stages whose inputs are ready run concurrently, e.g.
+data_quality_validation runs alongside the experiment_design chain.
+
+Run from the repository root:
+
+    python -m src.pipeline              # run whatever is out of date
+    python -m src.pipeline --dry-run    # only report what would run
+    python -m src.pipeline --force analysis
+
+Notebooks are executed with ``jupyter nbconvert --execute`` (jupyter and
+nbconvert are in requirements.txt); the executed copies are written to
+data/cache/pipeline_runs so the committed notebooks are left untouched.
+"""
+import argparse
+import hashlib
+import json
+import re
+import subprocess
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from .data_loader import CACHE_DIR, ROOT_DIR
+
+
+NOTEBOOK_DIR = ROOT_DIR / 'notebooks'
+SRC_DIR = ROOT_DIR / 'src'
+STATE_PATH = CACHE_DIR / 'pipeline_state.json'
+RUN_DIR = CACHE_DIR / 'pipeline_runs'
+
+
+@dataclass
+class Stage:
+    name: str
+    inputs: list
+    outputs: list
+    params: dict = field(default_factory=dict)
+
+    @property
+    def notebook(self):
+        return NOTEBOOK_DIR / f'{self.name}.ipynb'
+
+
+def processed(name):
+    """A processed table as written by ``save_processed``: the CSV and its columnar artifact."""
+    return [f'data/processed/{name}.csv', f'data/processed/{name}.cols']
+
+
+STAGES = [
+    Stage('data_exploration',
+          inputs=['data/raw/olist_orders_dataset.csv',
+                  'data/raw/olist_order_items_dataset.csv'],
+          outputs=processed('order_totals') + [
+              'results/figures/item_price_distribution_with_threshold.png',
+              'results/figures/order_price_distribution_with_threshold.png']),
+    Stage('data_quality_validation',
+          inputs=processed('order_totals') + ['data/raw/olist_orders_dataset.csv'],
+          outputs=['data/processed/validation_report.csv',
+                   'results/figures/outlier_analysis.png']),
+    Stage('experiment_design',
+          inputs=processed('order_totals'),
+          outputs=processed('experiment_design') + ['results/figures/experiment_design_overview.png']),
+    Stage('treatment_assignment',
+          inputs=processed('experiment_design'),
+          outputs=processed('experiment_results') + ['results/figures/treatment_effect_analysis.png']),
+    Stage('analysis',
+          inputs=processed('experiment_results'),
+          outputs=processed('analysis_results') + ['results/figures/segmentation_analysis.png']),
+    Stage('results_summary',
+          inputs=processed('experiment_results') + processed('analysis_results'),
+          outputs=['results/figures/final_summary.png']),
+]
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _sha256_path(path):
+    """Hash of a file, or of every file in a directory such as a ``.cols`` artifact.
+
+    An artifact's meta.json also records the mtime of the CSV it was built
+    from; that stamp is left out so rewriting identical data keeps the key.
+    """
+    if not path.is_dir():
+        return _sha256_file(path)
+    digest = hashlib.sha256()
+    for file in sorted(p for p in path.rglob('*') if p.is_file()):
+        if file.name == 'meta.json':
+            meta = json.loads(file.read_text())
+            meta.pop('source', None)
+            file_hash = hashlib.sha256(json.dumps(meta, sort_keys=True).encode()).hexdigest()
+        else:
+            file_hash = _sha256_file(file)
+        digest.update(f'{file.relative_to(path)}:{file_hash}\n'.encode())
+    return digest.hexdigest()
+
+
+def _notebook_code(path):
+    """Concatenated source of a notebook's code cells (outputs are ignored)."""
+    notebook = json.loads(path.read_text(encoding='utf-8'))
+    return '\n'.join(''.join(cell['source']) for cell in notebook['cells']
+                     if cell['cell_type'] == 'code')
+
+
+def _src_modules(code, seen=None):
+    """``src`` modules imported by some code, followed transitively."""
+    seen = set() if seen is None else seen
+    for module in re.findall(r'^\s*(?:from|import) (?:src)?\.(\w+)', code, re.MULTILINE):
+        path = SRC_DIR / f'{module}.py'
+        if module not in seen and path.exists():
+            seen.add(module)
+            _src_modules(path.read_text(encoding='utf-8'), seen)
+    return seen
+
+
+def stage_key(stage):
+    """Hash of a stage's inputs, code and parameters."""
+    digest = hashlib.sha256()
+    for path in sorted(stage.inputs):
+        digest.update(f'input:{path}:{_sha256_path(ROOT_DIR / path)}\n'.encode())
+
+    code = _notebook_code(stage.notebook)
+    digest.update(code.encode())
+    for module in sorted(_src_modules(code)):
+        digest.update(f'module:{module}:{_sha256_file(SRC_DIR / f"{module}.py")}\n'.encode())
+
+    digest.update(json.dumps(stage.params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def _read_state():
+    if STATE_PATH.exists():
+        return json.loads(STATE_PATH.read_text())
+    return {}
+
+
+def _write_state(state):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    STATE_PATH.write_text(json.dumps(state, indent=1, sort_keys=True))
+
+
+def is_up_to_date(stage, state):
+    outputs_exist = all((ROOT_DIR / path).exists() for path in stage.outputs)
+    inputs_exist = all((ROOT_DIR / path).exists() for path in stage.inputs)
+    return outputs_exist and inputs_exist and state.get(stage.name) == stage_key(stage)
+
+
+def dependencies(stages):
+    """Map each stage name to the names of the stages producing its inputs."""
+    producer = {path: stage.name for stage in stages for path in stage.outputs}
+    return {stage.name: {producer[path] for path in stage.inputs if path in producer}
+            for stage in stages}
+
+
+def run_notebook(stage):
+    """Execute a stage's notebook with nbconvert."""
+    RUN_DIR.mkdir(parents=True, exist_ok=True)
+    subprocess.run(
+        [sys.executable, '-m', 'jupyter', 'nbconvert', '--to', 'notebook', '--execute',
+         str(stage.notebook), '--output', stage.name, '--output-dir', str(RUN_DIR),
+         '--ExecutePreprocessor.timeout=-1'],
+        check=True,
+    )
+
+
+def run_pipeline(stages=None, jobs=2, force=(), dry_run=False, runner=run_notebook):
+    """Run out-of-date stages in dependency order, independent ones concurrently.
+
+    Returns {stage name: 'skipped' | 'ran' | 'would run' | 'failed' | 'blocked'}.
+    """
+    stages = stages or STAGES
+    by_name = {stage.name: stage for stage in stages}
+    deps = dependencies(stages)
+    state = _read_state()
+    status = {}
+
+    def stale(stage):
+        # In a dry run, upstream stages have not produced their new outputs yet.
+        # After a real run the input hashes decide: identical outputs -> skip.
+        if stage.name in force or any(status[d] == 'would run' for d in deps[stage.name]):
+            return True
+        return not is_up_to_date(stage, state)
+
+    pending = set(by_name)
+    running = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            ready = [name for name in sorted(pending) if deps[name] <= set(status)]
+            for name in ready:
+                pending.discard(name)
+                stage = by_name[name]
+                if any(status[d] in ('failed', 'blocked') for d in deps[name]):
+                    status[name] = 'blocked'
+                elif not stale(stage):
+                    status[name] = 'skipped'
+                elif dry_run:
+                    status[name] = 'would run'
+                else:
+                    print(f"[pipeline] running {name}")
+                    running[pool.submit(runner, stage)] = name
+
+            if any(name in status for name in ready):
+                continue  # stages decided without running may unblock others
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    future.result()
+                except Exception as error:  # keep independent branches going
+                    status[name] = 'failed'
+                    print(f"[pipeline] {name} failed: {error}")
+                else:
+                    status[name] = 'ran'
+                    state[name] = stage_key(by_name[name])
+                    _write_state(state)
+
+    for name in by_name:
+        print(f"{name:<25} {status.get(name, 'blocked')}")
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the notebook pipeline, skipping up-to-date stages")
+    parser.add_argument('--jobs', type=int, default=2, help="stages to run concurrently")
+    parser.add_argument('--force', nargs='*', default=[], help="stages to rerun regardless of cache")
+    parser.add_argument('--dry-run', action='store_true', help="only report what would run")
+    args = parser.parse_args()
+
+    status = run_pipeline(jobs=args.jobs, force=set(args.force), dry_run=args.dry_run)
+    if any(s in ('failed', 'blocked') for s in status.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""Power, sample size and minimum detectable effect for the revenue test.
+
+The formulas generalise the one in experiment_design,
+
+    n = 2 * (z_alpha + z_beta)^2 * std^2 / mde^2     (orders per group)
+
+to an allocation ratio ``ratio = n_treatment / n_control`` and a variance
+factor (1 for the raw metric, 1 - rho^2 with CUPED):
+
+    Var(difference) = variance_factor * std^2 * (1 / n_control + 1 / n_treatment)
+
+Every argument may be a scalar or an array; they are broadcast against each
+other, so ``sample_size(mde=np.linspace(4, 16, 100)[:, None], std=[250, 300])``
+evaluates a 100 x 2 grid in one call. ``grid`` returns the same as a tidy
+DataFrame over the product of the given values.
+
+``design_parameters`` gives the design of experiment_design (5% MDE on the
+order_totals revenue) for modules that test against it.
+
+``simulated_power`` checks the normal approximation by resampling a real
+revenue distribution and running the pooled t-test of analysis.ipynb on
+each simulated experiment. ``simulate_rejections`` is the simulator behind
+it and behind ``src.power_simulation``; replicates use common random
+numbers across sample sizes.
+
+    python -m src.power --mde-pct 3 5 8 --ratio 1 2 --variance-factor 1 0.8
+"""
+import argparse
+import itertools
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .artifacts import load_processed
+from .rng import SEED, stream
+
+
+ALPHA = 0.05
+POWER = 0.80
+
+# Minimum detectable effect of experiment_design, as % of baseline revenue
+MDE_PCT = 5.0
+
+
+def _z(alpha, power, two_sided=True):
+    alpha = np.asarray(alpha, dtype=np.float64)
+    z_alpha = stats.norm.ppf(1 - alpha / 2) if two_sided else stats.norm.ppf(1 - alpha)
+    return z_alpha, stats.norm.ppf(np.asarray(power, dtype=np.float64))
+
+
+def sample_size(mde, std, alpha=ALPHA, power=POWER, ratio=1.0, variance_factor=1.0, two_sided=True):
+    """Orders needed in the control group (treatment needs ``ratio`` times as many).
+
+    Returns an integer array (or scalar) broadcast over all arguments.
+    """
+    z_alpha, z_beta = _z(alpha, power, two_sided)
+    ratio = np.asarray(ratio, dtype=np.float64)
+    n = (1 + 1 / ratio) * ((z_alpha + z_beta) ** 2) * (np.asarray(std) ** 2) * variance_factor / (np.asarray(mde) ** 2)
+    return np.ceil(n).astype(np.int64)
+
+
+def minimum_detectable_effect(n, std, alpha=ALPHA, power=POWER, ratio=1.0, variance_factor=1.0,
+                              two_sided=True):
+    """Smallest effect detected with the given power, ``n`` control orders."""
+    z_alpha, z_beta = _z(alpha, power, two_sided)
+    se = np.sqrt(variance_factor * (1 + 1 / np.asarray(ratio, dtype=np.float64)) / np.asarray(n)) * std
+    return (z_alpha + z_beta) * se
+
+
+def power(n, mde, std, alpha=ALPHA, ratio=1.0, variance_factor=1.0, two_sided=True):
+    """Probability of rejecting H0 when the true effect is ``mde``."""
+    z_alpha, _ = _z(alpha, 0.5, two_sided)
+    se = np.sqrt(variance_factor * (1 + 1 / np.asarray(ratio, dtype=np.float64)) / np.asarray(n)) * std
+    shift = np.asarray(mde) / se
+    result = stats.norm.cdf(shift - z_alpha)
+    if two_sided:
+        result = result + stats.norm.cdf(-shift - z_alpha)
+    return result
+
+
+def grid(solve='n', **axes):
+    """Tidy table over the product of ``axes`` with a column for the solved quantity.
+
+    ``solve`` is 'n' (needs mde, std), 'mde' (needs n, std) or 'power'
+    (needs n, mde, std); other keyword axes are alpha, power, ratio and
+    variance_factor.
+    """
+    names = list(axes)
+    table = pd.DataFrame(list(itertools.product(*(np.atleast_1d(axes[k]) for k in names))), columns=names)
+    args = {k: table[k].to_numpy() for k in names}
+    if solve == 'n':
+        table['n_control'] = sample_size(**args)
+        table['n_treatment'] = np.ceil(table['n_control'] * args.get('ratio', 1.0)).astype(np.int64)
+    elif solve == 'mde':
+        table['mde'] = minimum_detectable_effect(**args)
+    elif solve == 'power':
+        table['power'] = power(**args)
+    else:
+        raise ValueError(f"solve must be 'n', 'mde' or 'power', not {solve!r}")
+    return table
+
+
+def design_parameters(order_total=None, mde_pct=MDE_PCT, alpha=ALPHA, power=POWER):
+    """Baseline mean and std, MDE (BRL) and orders per group of the design.
+
+    ``order_total`` defaults to the order_totals revenue experiment_design
+    is computed from.
+    """
+    if order_total is None:
+        order_total = load_processed('order_totals', columns=['order_total'])['order_total']
+    baseline, std = order_total.mean(), order_total.std()
+    mde = mde_pct / 100 * baseline
+    return {'baseline': baseline, 'std': std, 'mde': mde, 'n': int(sample_size(mde, std, alpha, power))}
+
+
+def pooled_t_test(control, treatment, alpha=ALPHA):
+    """Rows of two (simulations x orders) arrays -> rejects H0 at ``alpha`` (two-sided).
+
+    The same pooled-variance test as ``stats.ttest_ind``, vectorised across rows.
+    """
+    n1, n2 = control.shape[1], treatment.shape[1]
+    v1, v2 = control.var(axis=1, ddof=1), treatment.var(axis=1, ddof=1)
+    pooled = ((n1 - 1) * v1 + (n2 - 1) * v2) / (n1 + n2 - 2)
+    t = (treatment.mean(axis=1) - control.mean(axis=1)) / np.sqrt(pooled * (1 / n1 + 1 / n2))
+    return np.abs(t) > stats.t.ppf(1 - alpha / 2, n1 + n2 - 2)
+
+
+def power_interval(rejected, n_sims, confidence=0.95):
+    """Clopper-Pearson interval for a power estimated as ``rejected / n_sims``."""
+    rejected = np.asarray(rejected)
+    tail = (1 - confidence) / 2
+    lower = np.where(rejected > 0, stats.beta.ppf(tail, rejected, n_sims - rejected + 1), 0.0)
+    upper = np.where(rejected < n_sims, stats.beta.ppf(1 - tail, rejected + 1, n_sims - rejected), 1.0)
+    return lower, upper
+
+
+def simulate_rejections(price, shipping, n, treat, test=None, alpha=ALPHA, ratio=1.0, n_sims=1000, seed=SEED,
+                        chunk_size=200, uniforms=0):
+    """Number of ``n_sims`` simulated experiments with ``n`` control orders that reject H0.
+
+    Each arm resamples orders (``price`` and ``shipping``) with replacement;
+    ``treat(price, shipping, *u)`` gives the treatment arm's revenue, ``u``
+    being ``uniforms`` arrays of U(0, 1) draws shaped like its orders.
+    Control revenue is price + shipping. ``test`` defaults to
+    ``pooled_t_test``.
+
+    Replicate ``r`` draws its control orders, its treatment orders and each
+    uniform array from its own ``src.rng`` streams ('power', r, i), which
+    do not depend on ``n``: every sample size sees the same replicates
+    (common random numbers) and the orders drawn at ``n`` are the first
+    ``n`` drawn at any larger size, so estimated power moves smoothly with
+    ``n``. Raising ``n_sims`` adds replicates and keeps the earlier ones.
+    """
+    test = test or pooled_t_test
+    n, n_treatment = int(n), int(np.ceil(n * ratio))
+    rows = min(chunk_size, n_sims)
+    control = np.empty((rows, n), dtype=np.int64)
+    treatment = np.empty((rows, n_treatment), dtype=np.int64)
+    draws = [np.empty((rows, n_treatment)) for _ in range(uniforms)]
+
+    rejected = 0
+    for start in range(0, n_sims, chunk_size):
+        size = min(chunk_size, n_sims - start)
+        for row, r in enumerate(range(start, start + size)):
+            control[row] = stream(seed, 'power', r, 0).integers(0, len(price), size=n)
+            treatment[row] = stream(seed, 'power', r, 1).integers(0, len(price), size=n_treatment)
+            for i, u in enumerate(draws):
+                stream(seed, 'power', r, 2 + i).random(out=u[row])
+        c, t = control[:size], treatment[:size]
+        control_revenue = price[c] + shipping[c]
+        treatment_revenue = treat(price[t], shipping[t], *(u[:size] for u in draws))
+        rejected += int(test(control_revenue, treatment_revenue, alpha).sum())
+    return rejected
+
+
+def simulated_power(values, n, mde, alpha=ALPHA, ratio=1.0, variance_factor=1.0, n_sims=1000, seed=SEED,
+                    chunk=200):
+    """Share of simulated experiments that reject H0.
+
+    Both arms resample ``values`` (e.g. order_totals revenue) with
+    replacement, and treatment orders get ``mde`` added. A variance factor
+    below 1 shrinks ``values`` towards their mean, which keeps the skew of
+    the distribution while scaling its variance. Runs ``simulate_rejections``.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values.mean() + np.sqrt(variance_factor) * (values - values.mean())
+    rejected = simulate_rejections(values, np.zeros_like(values), n, lambda p, s: p + s + mde, alpha=alpha,
+                                   ratio=ratio, n_sims=n_sims, seed=seed, chunk_size=chunk)
+    return rejected / n_sims
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample sizes over a grid of design parameters")
+    parser.add_argument('--mde-pct', type=float, nargs='+', default=[MDE_PCT], help="MDE as %% of baseline revenue")
+    parser.add_argument('--alpha', type=float, nargs='+', default=[ALPHA])
+    parser.add_argument('--power', type=float, nargs='+', default=[POWER])
+    parser.add_argument('--ratio', type=float, nargs='+', default=[1.0])
+    parser.add_argument('--variance-factor', type=float, nargs='+', default=[1.0])
+    parser.add_argument('--simulate', type=int, default=0, metavar='SIMS',
+                        help="also check power by resampling order_totals (simulations per row)")
+    args = parser.parse_args()
+
+    order_totals = load_processed('order_totals', columns=['order_total'])['order_total']
+    baseline, std = order_totals.mean(), order_totals.std()
+
+    table = grid('n', mde=np.array(args.mde_pct) * baseline / 100, std=std, alpha=args.alpha,
+                 power=args.power, ratio=args.ratio, variance_factor=args.variance_factor)
+    if args.simulate:
+        table['simulated_power'] = [
+            simulated_power(order_totals, row.n_control, row.mde, row.alpha, row.ratio, row.variance_factor,
+                            args.simulate)
+            for row in table.itertuples()
+        ]
+    print(f"Baseline revenue {baseline:.2f} BRL, std {std:.2f} BRL\n")
+    print(table.round(3).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Declared column types for the raw Olist tables.
+
+Column kinds:
+    id        32-character hex keys, dictionary-encoded as pandas categories
+    category  low-cardinality strings (statuses, states, cities, ...)
+    datetime  timestamps, parsed at load
+    money     BRL amounts with two decimals, stored as float32
+    text      free text, left as strings
+    int8 / int32 / float32   narrowed numerics
+
+Money values in the data go up to ~13,700 BRL, where float32 still resolves
+well below a cent, so ``widen_money`` recovers the exact two-decimal float64
+value. Widen before summing so totals match the float64 notebooks.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Bump when a schema changes so typed caches are rebuilt
+SCHEMA_VERSION = 2
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+SCHEMAS = {
+    'customers': {
+        'customer_id': 'id',
+        'customer_unique_id': 'id',
+        'customer_zip_code_prefix': 'int32',
+        'customer_city': 'category',
+        'customer_state': 'category',
+    },
+    'geolocation': {
+        'geolocation_zip_code_prefix': 'int32',
+        'geolocation_lat': 'float32',
+        'geolocation_lng': 'float32',
+        'geolocation_city': 'category',
+        'geolocation_state': 'category',
+    },
+    'order_items': {
+        'order_id': 'id',
+        'order_item_id': 'int8',
+        'product_id': 'id',
+        'seller_id': 'id',
+        'shipping_limit_date': 'datetime',
+        'price': 'money',
+        'freight_value': 'money',
+    },
+    'order_payments': {
+        'order_id': 'id',
+        'payment_sequential': 'int8',
+        'payment_type': 'category',
+        'payment_installments': 'int8',
+        'payment_value': 'money',
+    },
+    'order_reviews': {
+        'review_id': 'id',
+        'order_id': 'id',
+        'review_score': 'int8',
+        'review_comment_title': 'text',
+        'review_comment_message': 'text',
+        'review_creation_date': 'datetime',
+        'review_answer_timestamp': 'datetime',
+    },
+    'orders': {
+        'order_id': 'id',
+        'customer_id': 'id',
+        'order_status': 'category',
+        'order_purchase_timestamp': 'datetime',
+        'order_approved_at': 'datetime',
+        'order_delivered_carrier_date': 'datetime',
+        'order_delivered_customer_date': 'datetime',
+        'order_estimated_delivery_date': 'datetime',
+    },
+    'products': {
+        'product_id': 'id',
+        'product_category_name': 'category',
+        'product_name_lenght': 'float32',
+        'product_description_lenght': 'float32',
+        'product_photos_qty': 'float32',
+        'product_weight_g': 'float32',
+        'product_length_cm': 'float32',
+        'product_height_cm': 'float32',
+        'product_width_cm': 'float32',
+    },
+    'sellers': {
+        'seller_id': 'id',
+        'seller_zip_code_prefix': 'int32',
+        'seller_city': 'category',
+        'seller_state': 'category',
+    },
+    'category_translation': {
+        'product_category_name': 'text',
+        'product_category_name_english': 'text',
+    },
+}
+
+_DTYPES = {
+    'id': 'category',
+    'category': 'category',
+    'money': 'float32',
+    'text': 'str',
+    'int8': 'int8',
+    'int32': 'int32',
+    'float32': 'float32',
+}
+
+
+def columns_of_kind(name, kind):
+    """Columns of a table declared with the given kind."""
+    return [col for col, k in SCHEMAS[name].items() if k == kind]
+
+
+def read_csv_kwargs(name, columns=None):
+    """Keyword arguments for ``pd.read_csv`` that apply the table's schema."""
+    schema = SCHEMAS[name]
+    wanted = list(schema) if columns is None else list(columns)
+    return {
+        'usecols': wanted,
+        'dtype': {col: _DTYPES[schema[col]] for col in wanted if schema[col] != 'datetime'},
+        'parse_dates': [col for col in wanted if schema[col] == 'datetime'],
+        'date_format': DATETIME_FORMAT,
+    }
+
+
+def apply_schema(df, name):
+    """Cast an already-loaded table to its declared types.
+
+    Used by ``load_table``. Categories come out sorted, as with the
+    ``union_categoricals(sort_categories=True)`` of parallel_ingest, so a
+    table has the same categories whichever way it was typed.
+    """
+    schema = SCHEMAS[name]
+    df = df.copy()
+    for col in df.columns:
+        kind = schema.get(col)
+        if kind is None:
+            continue
+        if kind == 'datetime':
+            df[col] = pd.to_datetime(df[col], format=DATETIME_FORMAT)
+        else:
+            df[col] = df[col].astype(_DTYPES[kind])
+    return df
+
+
+def widen_money(values):
+    """float32 money -> float64 rounded to cents (exact two-decimal values)."""
+    return np.round(np.asarray(values, dtype=np.float64), 2)
+
+
+def memory_mb(df):
+    """Deep memory usage of a DataFrame in MB."""
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def memory_report(before, after, name=''):
+    """Print the memory of a table before and after typing."""
+    mb_before = memory_mb(before)
+    mb_after = memory_mb(after)
+    change = (mb_after / mb_before - 1) * 100 if mb_before else 0
+    print(f"{name}: {mb_before:.1f} MB -> {mb_after:.1f} MB ({change:+.0f}%)")
+    return mb_before, mb_after
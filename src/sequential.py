@@ -0,0 +1,208 @@
+"""Always-valid sequential test of mean final_revenue (mSPRT).
+
+analysis.ipynb tests once, after all orders are in. ``SequentialTest``
+instead looks at the data after every batch of orders and can stop as soon
+as the evidence is strong enough, while keeping the false positive rate at
+``alpha`` however often it looks.
+
+It is the mixture sequential probability ratio test (mSPRT) with a normal
+mixing distribution N(0, tau^2) over the treatment - control difference.
+With the current difference in means ``d`` and its variance
+``V = s_c^2 / n_c + s_t^2 / n_t``, the mixture likelihood ratio is
+
+    L = sqrt(V / (V + tau^2)) * exp(d^2 tau^2 / (2 V (V + tau^2)))
+
+and the always-valid p-value is the running minimum of ``1 / L``. The test
+stops and rejects when the p-value falls below ``alpha``, and stops without
+rejecting at the fixed horizon (the orders per arm of experiment_design).
+``tau`` defaults to the design's minimum detectable effect (5% of baseline
+revenue). Both come from ``src.power.design_parameters`` on order_totals.
+
+    python -m src.sequential replay      # feed experiment_results in batches
+    python -m src.sequential simulate    # expected sample size on resampled Olist orders
+"""
+import argparse
+from functools import cache
+
+import numpy as np
+import pandas as pd
+
+from .artifacts import load_processed
+from .design import GROUPS
+from .power import design_parameters
+from .rng import SEED, stream
+from .simulation import compute_final_revenue
+from .sufficient_stats import merge_moments
+
+
+ALPHA = 0.05
+
+BATCH_SIZE = 500
+
+
+@cache
+def design():
+    """Minimum detectable effect (BRL) and per-arm sample size of experiment_design."""
+    parameters = design_parameters()
+    return parameters['mde'], parameters['n']
+
+
+def mixture_likelihood_ratio(diff, variance, tau):
+    """mSPRT likelihood ratio for a normal mixture N(0, tau^2); vectorised."""
+    tau2 = tau ** 2
+    return np.sqrt(variance / (variance + tau2)) * np.exp(diff ** 2 * tau2 / (2 * variance * (variance + tau2)))
+
+
+class SequentialTest:
+    """Incremental mSPRT over batches of (group, revenue) observations."""
+
+    def __init__(self, alpha=ALPHA, tau=None, horizon=None):
+        mde, n = design()
+        self.alpha = alpha
+        self.tau = mde if tau is None else tau
+        self.horizon = n if horizon is None else horizon
+        self.moments = {group: {'n': 0, 'mean': 0.0, 'm2': 0.0, 'min': np.inf, 'max': -np.inf}
+                        for group in GROUPS}
+        self.p_value = 1.0
+        self.history = []
+
+    def update(self, groups, revenue):
+        """Fold in a batch of orders and return the current decision."""
+        groups = np.asarray(groups)
+        revenue = np.asarray(revenue, dtype=np.float64)
+        for group in GROUPS:
+            values = revenue[groups == group]
+            if len(values):
+                batch = {'n': len(values), 'mean': values.mean(),
+                         'm2': ((values - values.mean()) ** 2).sum(),
+                         'min': values.min(), 'max': values.max()}
+                merged = merge_moments(self.moments[group], batch)
+                self.moments[group] = {name: np.asarray(value).item() for name, value in merged.items()}
+
+        control, treatment = (self.moments[group] for group in GROUPS)
+        if min(control['n'], treatment['n']) > 1:
+            diff = treatment['mean'] - control['mean']
+            variance = (control['m2'] / (control['n'] - 1) / control['n']
+                        + treatment['m2'] / (treatment['n'] - 1) / treatment['n'])
+            ratio = mixture_likelihood_ratio(diff, variance, self.tau)
+            self.p_value = min(self.p_value, 1 / ratio)
+        else:
+            diff = np.nan
+
+        decision = self.decision()
+        self.history.append({'n_control': control['n'], 'n_treatment': treatment['n'],
+                             'difference': diff, 'p_value': self.p_value, 'decision': decision})
+        return decision
+
+    def decision(self):
+        """'reject' once the always-valid p-value is below alpha, 'horizon' at the
+        fixed sample size, else 'continue'."""
+        if self.p_value < self.alpha:
+            return 'reject'
+        if min(m['n'] for m in self.moments.values()) >= self.horizon:
+            return 'horizon'
+        return 'continue'
+
+
+def replay(experiment_results, batch_size=BATCH_SIZE, alpha=ALPHA, tau=None, stop=True):
+    """Feed experiment_results in arrival batches; returns the test's history."""
+    test = SequentialTest(alpha, tau, horizon=np.inf)
+    revenue = compute_final_revenue(experiment_results)
+    groups = experiment_results['group'].to_numpy()
+    for start in range(0, len(groups), batch_size):
+        decision = test.update(groups[start:start + batch_size], revenue[start:start + batch_size])
+        if stop and decision == 'reject':
+            break
+    return pd.DataFrame(test.history)
+
+
+def simulate(baseline, effect=0.0, n_sims=1000, horizon=None, batch_size=BATCH_SIZE // 2,
+             alpha=ALPHA, tau=None, seed=SEED, key=0, chunk=200):
+    """Monte Carlo of the mSPRT on orders resampled from ``baseline``.
+
+    Each simulated experiment draws ``horizon`` orders per arm from the
+    baseline revenue distribution, adds ``effect`` BRL to treatment orders,
+    and looks after every ``batch_size`` orders per arm. All looks of
+    ``chunk`` experiments are computed at once from cumulative sums.
+
+    Returns a dict with the rejection rate, mean and median orders per arm
+    at stopping, and the fixed-horizon z-test rejection rate for comparison.
+    """
+    mde, n = design()
+    horizon = n if horizon is None else horizon
+    tau = mde if tau is None else tau
+    rng = stream(seed, 'sequential', key)
+    baseline = np.asarray(baseline, dtype=np.float64)
+    looks = np.arange(batch_size, horizon + batch_size, batch_size).clip(max=horizon)
+    threshold = 1 / alpha
+
+    stopped_at, rejected, fixed_rejected = [], [], []
+    for start in range(0, n_sims, chunk):
+        size = min(chunk, n_sims - start)
+        arms = []
+        for shift in (0.0, effect):
+            values = baseline[rng.integers(0, len(baseline), size=(size, horizon))] + shift
+            sums = np.cumsum(values, axis=1)[:, looks - 1]
+            sums_sq = np.cumsum(values ** 2, axis=1)[:, looks - 1]
+            means = sums / looks
+            variances = (sums_sq - looks * means ** 2) / (looks - 1)
+            arms.append((means, variances))
+
+        (control_mean, control_var), (treatment_mean, treatment_var) = arms
+        diff = treatment_mean - control_mean
+        variance = (control_var + treatment_var) / looks
+        crossed = mixture_likelihood_ratio(diff, variance, tau) >= threshold
+
+        any_crossed = crossed.any(axis=1)
+        first = np.where(any_crossed, crossed.argmax(axis=1), len(looks) - 1)
+        stopped_at.append(looks[first])
+        rejected.append(any_crossed)
+        fixed_rejected.append(np.abs(diff[:, -1]) / np.sqrt(variance[:, -1]) > 1.959963984540054)
+
+    stopped_at = np.concatenate(stopped_at)
+    return {
+        'effect': effect,
+        'rejection_rate': np.concatenate(rejected).mean(),
+        'fixed_horizon_rejection_rate': np.concatenate(fixed_rejected).mean(),
+        'mean_n_per_arm': stopped_at.mean(),
+        'median_n_per_arm': np.median(stopped_at),
+        'savings_pct': (1 - stopped_at.mean() / horizon) * 100,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Always-valid sequential test of final revenue")
+    parser.add_argument('--alpha', type=float, default=ALPHA)
+    parser.add_argument('--tau', type=float, help="mixture scale in BRL (default: the MDE)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    replay_parser = commands.add_parser('replay', help="run the test over experiment_results")
+    replay_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    simulate_parser = commands.add_parser('simulate', help="expected sample size on resampled orders")
+    simulate_parser.add_argument('--effects', type=float, nargs='+',
+                                 help="added BRL per treatment order (default: 0, MDE / 2, MDE, 2 * MDE)")
+    simulate_parser.add_argument('--sims', type=int, default=1000)
+    simulate_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE // 2, help="orders per arm per look")
+    simulate_parser.add_argument('--seed', type=int, default=SEED)
+    args = parser.parse_args()
+
+    if args.command == 'replay':
+        results = load_processed('experiment_results',
+                                 columns=['group', 'final_price', 'total_shipping'])
+        history = replay(results, args.batch_size, args.alpha, args.tau, stop=False)
+        print(history.iloc[::5].to_string(index=False))
+        final = history.iloc[-1]
+        print(f"\nFinal always-valid p-value: {final['p_value']:.4f} ({final['decision']})")
+    else:
+        baseline = load_processed('order_totals', columns=['order_total'])['order_total']
+        mde, _ = design()
+        effects = args.effects or [0.0, mde / 2, mde, 2 * mde]
+        rows = [simulate(baseline, effect, args.sims, batch_size=args.batch_size, alpha=args.alpha,
+                         tau=args.tau, seed=args.seed, key=i)
+                for i, effect in enumerate(effects)]
+        print(pd.DataFrame(rows).round(3).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Treatment simulation from treatment_assignment.ipynb.
+
+Treatment customers below the free shipping threshold respond with
+probability ``response_rate``; a responder adds what is needed to reach the
+threshold plus a uniform extra of up to ``max_addition - min_addition`` BRL.
+Orders at or above the threshold in the treatment group pay no shipping.
+
+``simulate_responders`` draws the responders and all their extras in one
+call each and writes the columns as whole arrays. With the same random
+state it reproduces the notebook's former per-responder loop exactly: the
+loop drew one uniform per responder in responder order, which is the same
+stream as a single draw of ``num_responders`` values.
+"""
+import numpy as np
+
+
+THRESHOLD = 100       # Free shipping threshold (BRL)
+RESPONSE_RATE = 0.40  # Share of eligible customers who add items
+MIN_ADDITION = 15     # Minimum amount added (BRL)
+MAX_ADDITION = 35     # Maximum amount added (BRL)
+
+# Order-size segments used in analysis and results_summary (by original total_price)
+SEGMENT_BINS = [0, 75, 150, np.inf]
+SEGMENT_LABELS = ['Small', 'Medium', 'Large']
+
+# Treatment effect columns of the resampling engines: whole arm, then each segment
+EFFECT_COLUMNS = ['overall'] + SEGMENT_LABELS
+
+
+def simulate_responders(experiment_results, response_rate=RESPONSE_RATE, min_addition=MIN_ADDITION,
+                        max_addition=MAX_ADDITION, threshold=THRESHOLD, random_state=None,
+                        extra_random_state=None):
+    """Add ``responded``, ``amount_added`` and ``final_price`` columns.
+
+    ``random_state`` is a ``np.random.RandomState`` or ``Generator`` used to
+    pick responders; the global NumPy random state is used when it is None.
+    Extras come from ``extra_random_state`` if given, else the same state.
+    Returns a new DataFrame.
+    """
+    rng = np.random if random_state is None else random_state
+    extra_rng = rng if extra_random_state is None else extra_random_state
+    results = experiment_results.copy()
+
+    total_price = results['total_price'].to_numpy(dtype=np.float64)
+    eligible = (results['group'] == 'treatment').to_numpy() & (total_price < threshold)
+
+    eligible_positions = np.flatnonzero(eligible)
+    num_responders = int(len(eligible_positions) * response_rate)
+
+    # Responders and their extra spend, one batched draw each
+    responders = rng.choice(eligible_positions, size=num_responders, replace=False)
+    extra = extra_rng.uniform(0, max_addition - min_addition, size=num_responders)
+
+    responded = np.zeros(len(results), dtype=bool)
+    responded[responders] = True
+
+    amount_added = np.zeros(len(results))
+    amount_added[responders] = (threshold - total_price[responders]) + extra
+
+    final_price = total_price.copy()
+    final_price[responders] = total_price[responders] + amount_added[responders]
+
+    results['responded'] = responded
+    results['amount_added'] = amount_added
+    results['final_price'] = final_price
+    return results
+
+
+def segment_codes(total_price):
+    """Index into SEGMENT_LABELS for each price (-1 outside the bins).
+
+    Bins are right-closed like ``pd.cut(total_price, bins=SEGMENT_BINS)``.
+    """
+    codes = np.searchsorted(SEGMENT_BINS, np.asarray(total_price, dtype=np.float64), side='left') - 1
+    codes[(codes < 0) | (codes >= len(SEGMENT_LABELS))] = -1
+    return codes
+
+
+def compute_final_revenue(experiment_results, threshold=THRESHOLD):
+    """Revenue per order: treatment orders reaching the threshold ship free."""
+    final_price = experiment_results['final_price'].to_numpy(dtype=np.float64)
+    shipping = experiment_results['total_shipping'].to_numpy(dtype=np.float64)
+    free_shipping = (experiment_results['group'] == 'treatment').to_numpy() & (final_price >= threshold)
+    return np.where(free_shipping, final_price, final_price + shipping)
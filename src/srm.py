@@ -0,0 +1,215 @@
+"""Sample ratio mismatch (SRM) checks on the control / treatment split.
+
+If the observed split differs from the designed one by more than chance
+allows, something upstream (assignment, logging, filtering) is broken, and
+the difference in means can no longer be trusted. The check is a
+goodness-of-fit test of the group counts against the designed ratio,
+Pearson's chi-square or the G-test (``scipy.stats.power_divergence``), run
+overall and for every level of segment, customer_state and purchase day.
+The usual alert level is p < 0.001, since the check runs on many cells.
+
+``srm_table`` does it in batch, e.g. over experiment_design.csv; all levels
+of a dimension are one ``power_divergence`` call on a (levels x 2) count
+matrix. This is a fixed-horizon test, valid once, on the final counts.
+
+``SrmMonitor`` keeps the same counts over a stream of assignment events and
+checks them after every event, so it cannot reuse that test: checking a
+chi-square p-value continuously would eventually alert on a healthy split.
+It runs a sequential test instead, the two-group case of the multinomial
+mSPRT (Lindon & Malek, 2020). With a Beta(k p0, k (1 - p0)) mixture over
+the treatment share, centred on the designed share p0, the Bayes factor of
+t treatment and c control orders against H0 is
+
+    BF = B(k p0 + t, k (1 - p0) + c) / B(k p0, k (1 - p0)) / (p0^t (1 - p0)^c)
+
+a nonnegative martingale under H0, so by Ville's inequality BF ever
+reaching 1 / alpha has probability at most alpha however often it is
+checked. min(1, 1 / max BF so far) is an always-valid p-value. Each update
+increments one counter per dimension and recomputes the log Bayes factor of
+those cells only from ``math.lgamma``, so an event costs O(1) however many
+have been seen. A cell records an alert the first time it crosses 1 / alpha.
+
+    python -m src.srm batch
+    python -m src.srm stream
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .artifacts import load_processed
+from .design import GROUPS
+from .stratification import add_strata_columns
+
+
+DIMENSIONS = ['segment', 'customer_state', 'purchase_date']
+
+# Alert level for the SRM p-value
+ALPHA = 0.001
+
+# Cells with fewer orders are reported but never alert (the batch chi-square is unreliable there)
+MIN_ORDERS = 100
+
+# Concentration k of the Beta mixture in the sequential test; larger values
+# put the prior closer to the designed share, for small deviations
+PRIOR_CONCENTRATION = 100
+
+METHODS = {'chi2': 'pearson', 'g': 'log-likelihood'}
+
+
+def srm_test(counts, ratio=(0.5, 0.5), method='chi2'):
+    """Statistic and p-value for rows of (control, treatment) counts."""
+    counts = np.atleast_2d(np.asarray(counts, dtype=np.float64))
+    ratio = np.asarray(ratio, dtype=np.float64) / np.sum(ratio)
+    expected = counts.sum(axis=1, keepdims=True) * ratio
+    with np.errstate(invalid='ignore', divide='ignore'):
+        statistic, p_value = stats.power_divergence(counts, expected, axis=1, lambda_=METHODS[method])
+    return statistic, p_value
+
+
+def srm_table(orders, dimensions=DIMENSIONS, ratio=(0.5, 0.5), method='chi2', alpha=ALPHA,
+              min_orders=MIN_ORDERS):
+    """SRM test overall and for each level of ``dimensions``.
+
+    Returns a DataFrame indexed by (dimension, level) with the group counts,
+    treatment share, statistic, p-value and an ``alert`` flag.
+    """
+    tables = [pd.crosstab(pd.Series('all', index=orders.index, name='level'), orders['group'])
+              .assign(dimension='overall')]
+    for dimension in dimensions:
+        counts = pd.crosstab(orders[dimension].rename('level'), orders['group'])
+        tables.append(counts.assign(dimension=dimension))
+
+    table = pd.concat(tables).reindex(columns=GROUPS + ['dimension'], fill_value=0)
+    table = table.reset_index().set_index(['dimension', 'level'])
+    counts = table[GROUPS].to_numpy()
+    table['n'] = counts.sum(axis=1)
+    table['treatment_share'] = table['treatment'] / table['n']
+    table['statistic'], table['p_value'] = srm_test(counts, ratio, method)
+    table['alert'] = (table['p_value'] < alpha) & (table['n'] >= min_orders)
+    return table
+
+
+def _log_beta(a, b):
+    return math.lgamma(a) + math.lgamma(b) - math.lgamma(a + b)
+
+
+def log_bayes_factor(control, treatment, share, concentration=PRIOR_CONCENTRATION):
+    """Log Bayes factor of the Beta mixture against the designed treatment ``share``, for one cell."""
+    a, b = concentration * share, concentration * (1 - share)
+    return (_log_beta(a + treatment, b + control) - _log_beta(a, b)
+            - treatment * math.log(share) - control * math.log(1 - share))
+
+
+class SrmMonitor:
+    """Streaming SRM counters overall and per level of each dimension, with a sequential test."""
+
+    def __init__(self, ratio=(0.5, 0.5), alpha=ALPHA, min_orders=MIN_ORDERS, dimensions=DIMENSIONS,
+                 concentration=PRIOR_CONCENTRATION):
+        self.share = ratio[1] / sum(ratio)
+        self.alpha = alpha
+        self.min_orders = min_orders
+        self.dimensions = list(dimensions)
+        self.concentration = concentration
+        self.critical = math.log(1 / alpha)
+        self._group_index = {group: i for i, group in enumerate(GROUPS)}
+        self.counts = {('overall', 'all'): [0, 0]}
+        # Largest log Bayes factor each cell has reached, for the always-valid p-value
+        self.peak = {}
+        self.alerted = set()
+        self.alerts = []
+        self.events = 0
+
+    def update(self, group, **levels):
+        """Count one assignment event; ``levels`` gives its value per dimension."""
+        g = self._group_index[group]
+        self.events += 1
+        cells = [('overall', 'all')] + [(d, levels[d]) for d in self.dimensions if d in levels]
+        for cell in cells:
+            counts = self.counts.get(cell)
+            if counts is None:
+                counts = self.counts[cell] = [0, 0]
+            counts[g] += 1
+            self._check(cell, counts)
+
+    def _check(self, cell, counts):
+        control, treatment = counts
+        log_bf = log_bayes_factor(control, treatment, self.share, self.concentration)
+        if log_bf > self.peak.get(cell, 0.0):
+            self.peak[cell] = log_bf
+        # An SRM invalidates the cell's data, so a cell alerts once and stays flagged
+        if log_bf >= self.critical and cell not in self.alerted and control + treatment >= self.min_orders:
+            self.alerted.add(cell)
+            self.alerts.append(self.alert(cell))
+
+    def p_value(self, cell):
+        """Always-valid p-value of a cell, min(1, 1 / largest Bayes factor so far)."""
+        return math.exp(-self.peak.get(cell, 0.0))
+
+    def alert(self, cell):
+        """Description of a cell's current state, as recorded in ``alerts``."""
+        control, treatment = self.counts[cell]
+        return {'event': self.events, 'dimension': cell[0], 'level': cell[1], 'control': control,
+                'treatment': treatment, 'test': 'sequential (Beta mixture SPRT)',
+                'log_bayes_factor': log_bayes_factor(control, treatment, self.share, self.concentration),
+                'p_value': self.p_value(cell)}
+
+    def table(self):
+        """Current counts as an ``srm_table``-style DataFrame, with the sequential test's columns."""
+        index = pd.MultiIndex.from_tuples(list(self.counts), names=['dimension', 'level'])
+        table = pd.DataFrame(list(self.counts.values()), index=index, columns=GROUPS)
+        table['n'] = table['control'] + table['treatment']
+        table['treatment_share'] = table['treatment'] / table['n']
+        table['log_bayes_factor'] = [log_bayes_factor(c, t, self.share, self.concentration)
+                                     for c, t in self.counts.values()]
+        table['p_value'] = [self.p_value(cell) for cell in self.counts]
+        table['alert'] = [cell in self.alerted for cell in self.counts]
+        return table
+
+
+def experiment_orders():
+    """experiment_design with segment, customer_state and purchase_date, in purchase order."""
+    orders = load_processed('experiment_design', columns=['order_id', 'total_price', 'group'])
+    orders = add_strata_columns(orders)
+    return orders.sort_values('purchase_date', kind='stable', ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample ratio mismatch checks on the group split")
+    parser.add_argument('--method', choices=list(METHODS), default='chi2', help="fixed-horizon test (batch)")
+    parser.add_argument('--alpha', type=float, default=ALPHA)
+    parser.add_argument('--min-orders', type=int, default=MIN_ORDERS)
+    parser.add_argument('--concentration', type=float, default=PRIOR_CONCENTRATION,
+                        help="Beta mixture concentration of the sequential test (stream)")
+    parser.add_argument('command', choices=['batch', 'stream'])
+    args = parser.parse_args()
+
+    orders = experiment_orders()
+    if args.command == 'batch':
+        table = srm_table(orders, method=args.method, alpha=args.alpha, min_orders=args.min_orders)
+        print(table.loc['overall'].round(4).to_string())
+        for dimension in DIMENSIONS:
+            cells = table.loc[dimension]
+            tested = cells[cells['n'] >= args.min_orders]
+            print(f"\n{dimension}: {len(cells)} levels, {len(tested)} with >= {args.min_orders} orders, "
+                  f"smallest p-value {tested['p_value'].min():.4f}, {int(cells['alert'].sum())} alert(s)")
+            print(tested.sort_values('p_value').head(3).round(4).to_string())
+    else:
+        monitor = SrmMonitor(alpha=args.alpha, min_orders=args.min_orders, concentration=args.concentration)
+        events = orders[['group'] + DIMENSIONS].to_dict('records')
+        start = time.perf_counter()
+        for event in events:
+            monitor.update(event.pop('group'), **event)
+        elapsed = time.perf_counter() - start
+        print(f"{len(events):,} events in {elapsed:.2f}s ({len(events) / elapsed:,.0f} events/s)")
+        print(f"{len(monitor.alerts)} alert(s)")
+        if monitor.alerts:
+            print(pd.DataFrame(monitor.alerts).round(4).to_string(index=False))
+        print(monitor.table().loc['overall'].round(4).to_string())
+
+
+if __name__ == '__main__':
+    main()
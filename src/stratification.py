@@ -0,0 +1,176 @@
+"""Stratified (blocked) assignment for experiment_design, with a balance report.
+
+experiment_design draws every order's group independently and checks
+balance by eye (``abs(treatment_baseline - control_baseline) < 5``). Here
+orders are blocked on order-size segment, customer_state and purchase
+month, and split within each stratum:
+
+    1. each order gets a uniform random key
+    2. one ``np.lexsort`` on (key, stratum) lays out every stratum as a
+       contiguous, randomly permuted run
+    3. the first floor(m * p) orders of a stratum of size m are treated;
+       the leftover fractions of all strata are rounded by systematic
+       sampling over the strata in random order, so a stratum gets one more
+       treated order with probability equal to its fraction and the total
+       is also within one order of p * n
+
+So every stratum and the experiment as a whole are balanced to within one
+order. The assignment is a sort plus a few vectorised passes; 5 million
+orders take about a second. Draws come from the ``src.rng`` 'strata' stream
+keyed by the attempt number, so ``stratified_design`` can redraw until the
+balance report meets a standardized mean difference (SMD) limit.
+
+``balance_report`` gives the SMD of every numeric covariate and of the
+share of each category, (mean_t - mean_c) / sqrt((var_t + var_c) / 2).
+|SMD| below 0.1 is the usual threshold for negligible imbalance.
+
+    python -m src.stratification --max-smd 0.02
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from .artifacts import load_processed
+from .data_loader import load_raw
+from .design import GROUPS
+from .rng import SEED, stream
+from .simulation import SEGMENT_LABELS, segment_codes
+
+
+STRATA_COLUMNS = ['segment', 'customer_state', 'purchase_month']
+
+NUMERIC_COVARIATES = ['total_price', 'total_shipping', 'num_items', 'order_total']
+
+# Conventional limit for a negligible standardized mean difference
+MAX_SMD = 0.1
+
+
+def add_strata_columns(orders):
+    """Add segment, customer_state, purchase_month and purchase_date (from the raw Olist tables)."""
+    raw_orders = load_raw('orders', columns=['order_id', 'customer_id', 'order_purchase_timestamp'])
+    customers = load_raw('customers', columns=['customer_id', 'customer_state'])
+    details = raw_orders.merge(customers, on='customer_id', how='left')
+    details['purchase_date'] = details['order_purchase_timestamp'].astype(str).str[:10]
+    details['purchase_month'] = details['purchase_date'].str[:7]
+
+    columns = ['order_id', 'customer_state', 'purchase_month', 'purchase_date']
+    orders = orders.merge(details[columns], on='order_id', how='left')
+    labels = np.array(SEGMENT_LABELS + ['Other'])
+    orders['segment'] = labels[segment_codes(orders['total_price'])]
+    return orders
+
+
+def strata_codes(orders, columns=STRATA_COLUMNS):
+    """Integer stratum id for every order (one per distinct combination of ``columns``)."""
+    if not columns:
+        return np.zeros(len(orders), dtype=np.int64)
+    return orders.groupby(list(columns), sort=False, dropna=False).ngroup().to_numpy()
+
+
+def stratified_assign(strata, rng, p=0.5):
+    """Treatment indicator with each stratum split p : 1 - p to within one order."""
+    strata = np.asarray(strata)
+    n = len(strata)
+    order = np.lexsort((rng.random(n), strata))
+    sorted_strata = strata[order]
+
+    # Run boundaries of each stratum in sorted order
+    starts = np.flatnonzero(np.r_[True, sorted_strata[1:] != sorted_strata[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+    rank = np.arange(n) - np.repeat(starts, sizes)
+
+    quota = sizes * p
+    n_treated = np.floor(quota).astype(np.int64)
+    fraction = quota - n_treated
+    shuffled = rng.permutation(len(sizes))
+    offset = rng.random()
+    cumulative = np.floor(np.r_[offset, offset + np.cumsum(fraction[shuffled])])
+    n_treated[shuffled] += np.diff(cumulative).astype(np.int64)
+
+    treated = np.empty(n, dtype=bool)
+    treated[order] = rank < np.repeat(n_treated, sizes)
+    return treated
+
+
+def balance_report(orders, group='group', numeric=NUMERIC_COVARIATES, categorical=STRATA_COLUMNS):
+    """Means and standardized mean difference per covariate (and per category share)."""
+    treated = (orders[group] == 'treatment').to_numpy()
+    columns = {name: orders[name].astype(np.float64) for name in numeric}
+    for name in categorical:
+        for value, indicator in pd.get_dummies(orders[name], dtype=np.float64).items():
+            columns[f'{name}={value}'] = indicator
+    values = pd.DataFrame(columns)
+
+    control, treatment = values[~treated], values[treated]
+    pooled_sd = np.sqrt((control.var() + treatment.var()) / 2)
+    report = pd.DataFrame({
+        'control_mean': control.mean(),
+        'treatment_mean': treatment.mean(),
+        'smd': (treatment.mean() - control.mean()) / pooled_sd.where(pooled_sd > 0),
+    })
+    report.index.name = 'covariate'
+    return report
+
+
+def stratum_imbalance(strata, treated):
+    """Largest |treated - control| count difference within any stratum."""
+    treated_counts = np.bincount(strata, weights=treated)
+    totals = np.bincount(strata)
+    return int(np.abs(2 * treated_counts - totals).max())
+
+
+def stratified_design(orders, columns=STRATA_COLUMNS, p=0.5, seed=SEED, max_smd=None, max_attempts=100):
+    """Add a stratified ``group`` column.
+
+    With ``max_smd``, redraw (attempt 0, 1, ...) until every |SMD| of the
+    balance report is below it, up to ``max_attempts`` draws; the draw with
+    the smallest largest |SMD| is kept. Returns (orders, report, attempts).
+    """
+    strata = strata_codes(orders, columns)
+    best = None
+    for attempt in range(max_attempts if max_smd is not None else 1):
+        treated = stratified_assign(strata, stream(seed, 'strata', attempt), p)
+        design = orders.assign(group=np.array(GROUPS)[treated.astype(int)])
+        report = balance_report(design, categorical=columns)
+        worst = report['smd'].abs().max()
+        if best is None or worst < best[0]:
+            best = (worst, design, report)
+        if max_smd is None or worst < max_smd:
+            break
+    _, design, report = best
+    return design, report, attempt + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stratified assignment of the experiment orders")
+    parser.add_argument('--strata', nargs='+', default=STRATA_COLUMNS, choices=STRATA_COLUMNS)
+    parser.add_argument('--max-smd', type=float, help="redraw until every |SMD| is below this")
+    parser.add_argument('--max-attempts', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=SEED)
+    args = parser.parse_args()
+
+    orders = add_strata_columns(load_processed('experiment_design'))
+    start = time.perf_counter()
+    design, report, attempts = stratified_design(orders.drop(columns='group'), args.strata, seed=args.seed,
+                                                 max_smd=args.max_smd, max_attempts=args.max_attempts)
+    elapsed = time.perf_counter() - start
+
+    simple = balance_report(orders, categorical=args.strata)
+    strata = strata_codes(orders, args.strata)
+    print(f"{len(design):,} orders in {strata.max() + 1:,} strata; {attempts} draw(s) in {elapsed:.2f}s\n")
+    print(pd.DataFrame({
+        'simple_smd': simple['smd'],
+        'stratified_smd': report['smd'],
+    }).loc[NUMERIC_COVARIATES].round(4).to_string())
+    print(f"\nLargest |SMD| over all covariates and category shares: "
+          f"simple {simple['smd'].abs().max():.4f}, stratified {report['smd'].abs().max():.4f}")
+    print(f"Largest within-stratum imbalance (orders): "
+          f"simple {stratum_imbalance(strata, (orders['group'] == 'treatment').to_numpy())}, "
+          f"stratified {stratum_imbalance(strata, (design['group'] == 'treatment').to_numpy())}")
+    print(f"Group sizes: {design['group'].value_counts().to_dict()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Mergeable sufficient statistics of a metric per (group, segment) cell.
+
+analysis and results_summary filter experiment_results once per group and
+segment to get counts, means and standard deviations. ``SufficientStats``
+computes them for every cell in one groupby pass:
+
+    n      number of orders
+    mean   mean of the metric
+    m2     sum of squared deviations from the mean (variance * (n - 1))
+    min, max
+
+(n, mean, m2) carries the same information as (n, sum, sum of squares) but
+does not lose precision when the variance is small next to the mean; sum
+and sum of squares are available as properties. Two accumulators over
+disjoint rows (chunks of a file, workers, days of traffic) are combined
+with ``merge`` using Chan et al.'s pairwise update, so the statistics of a
+stream never need the rows again.
+
+With a ``covariate`` (e.g. pre-treatment order_total for CUPED, see
+``src.cuped``) each cell also carries the covariate's mean and m2 and the
+co-moment of the two, sum((x - mean_x) * (y - mean)), built in the same
+groupby pass and merged with the same update.
+
+The t-test, confidence interval and Cohen's d of ``compare`` follow
+analysis.ipynb: pooled-variance t-test (``stats.ttest_ind``), CI with
+``df = min(n1 - 1, n2 - 1)`` and Cohen's d with the pooled standard deviation.
+"""
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .design import GROUPS
+from .simulation import SEGMENT_LABELS, segment_codes
+
+
+STAT_COLUMNS = ['n', 'mean', 'm2', 'min', 'max']
+
+# Extra columns when a covariate x is tracked alongside the metric
+COVARIATE_COLUMNS = ['mean_x', 'm2_x', 'c_xy']
+
+# Orders outside the segment bins (total_price of 0)
+OTHER_SEGMENT = 'Other'
+
+
+def merge_moments(a, b):
+    """Combine two sets of (n, mean, m2, min, max) moments over disjoint data.
+
+    Works elementwise on scalars, arrays or aligned DataFrame columns. The
+    covariate moments (``COVARIATE_COLUMNS``) are merged too when present.
+    """
+    n = a['n'] + b['n']
+    safe_n = np.where(n > 0, n, 1)
+    delta = b['mean'] - a['mean']
+    merged = {
+        'n': n,
+        'mean': np.where(n > 0, a['mean'] + delta * b['n'] / safe_n, 0.0),
+        'm2': a['m2'] + b['m2'] + delta ** 2 * a['n'] * b['n'] / safe_n,
+        'min': np.minimum(a['min'], b['min']),
+        'max': np.maximum(a['max'], b['max']),
+    }
+    if 'c_xy' in a:
+        delta_x = b['mean_x'] - a['mean_x']
+        merged['mean_x'] = np.where(n > 0, a['mean_x'] + delta_x * b['n'] / safe_n, 0.0)
+        merged['m2_x'] = a['m2_x'] + b['m2_x'] + delta_x ** 2 * a['n'] * b['n'] / safe_n
+        merged['c_xy'] = a['c_xy'] + b['c_xy'] + delta_x * delta * a['n'] * b['n'] / safe_n
+    return merged
+
+
+def compare_moments(control, treatment, confidence=0.95):
+    """Treatment vs control test statistics from two sets of moments."""
+    n1, n2 = control['n'], treatment['n']
+    s1 = np.sqrt(control['m2'] / (n1 - 1))
+    s2 = np.sqrt(treatment['m2'] / (n2 - 1))
+    mean_diff = treatment['mean'] - control['mean']
+
+    t_statistic, p_value = stats.ttest_ind_from_stats(treatment['mean'], s2, n2, control['mean'], s1, n1)
+
+    se_diff = np.sqrt(s1**2 / n1 + s2**2 / n2)
+    t_critical = stats.t.ppf(1 - (1 - confidence) / 2, min(n1 - 1, n2 - 1))
+    pooled_std = np.sqrt(((n1 - 1) * s1**2 + (n2 - 1) * s2**2) / (n1 + n2 - 2))
+
+    return {
+        'n_control': int(n1),
+        'n_treatment': int(n2),
+        'control_mean': control['mean'],
+        'treatment_mean': treatment['mean'],
+        'difference': mean_diff,
+        'pct_difference': mean_diff / control['mean'] * 100 if control['mean'] != 0 else 0.0,
+        't_statistic': t_statistic,
+        'p_value': p_value,
+        'se_diff': se_diff,
+        'ci_lower': mean_diff - t_critical * se_diff,
+        'ci_upper': mean_diff + t_critical * se_diff,
+        'pooled_std': pooled_std,
+        'cohens_d': mean_diff / pooled_std,
+    }
+
+
+class SufficientStats:
+    """Moments of one metric per (group, segment) cell.
+
+    ``table`` is a DataFrame indexed by (group, segment) with
+    ``STAT_COLUMNS`` (plus ``COVARIATE_COLUMNS`` if built with a
+    covariate). Build one with ``from_frame`` and combine with ``merge``
+    (or ``+``).
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    @classmethod
+    def from_frame(cls, df, value='final_revenue', group='group', segment=None, covariate=None):
+        """Moments of ``df[value]`` (and ``df[covariate]``) per group and segment, in one groupby pass.
+
+        Segments come from the ``segment`` column if given, else from
+        total_price with the usual Small / Medium / Large bins. ``value``
+        may also be an array aligned with ``df``.
+        """
+        if segment is None:
+            labels = np.array(SEGMENT_LABELS + [OTHER_SEGMENT])
+            segments = labels[segment_codes(df['total_price'])]  # code -1 -> 'Other'
+        else:
+            segments = df[segment].astype(str).to_numpy()
+
+        y = df[value] if isinstance(value, str) else pd.Series(value, index=df.index)
+        columns = {'y': y.astype(np.float64)}
+        aggregations = {'n': ('y', 'count'), 'mean': ('y', 'mean'), 'var': ('y', 'var'),
+                        'min': ('y', 'min'), 'max': ('y', 'max')}
+        if covariate is not None:
+            x = df[covariate].astype(np.float64)
+            # Products are taken around the overall means so the per-cell sum does not cancel
+            x0, y0 = x.mean(), columns['y'].mean()
+            columns.update(x=x, xy=(x - x0) * (columns['y'] - y0))
+            aggregations.update(mean_x=('x', 'mean'), var_x=('x', 'var'), sum_xy=('xy', 'sum'))
+
+        grouped = pd.DataFrame(columns).groupby([df[group].astype(str).to_numpy(), segments])
+        table = grouped.agg(**aggregations)
+        table.index.names = ['group', 'segment']
+        table['m2'] = table['var'].fillna(0.0) * (table['n'] - 1)
+        if covariate is None:
+            return cls(table[STAT_COLUMNS])
+
+        table['m2_x'] = table['var_x'].fillna(0.0) * (table['n'] - 1)
+        table['c_xy'] = table['sum_xy'] - table['n'] * (table['mean_x'] - x0) * (table['mean'] - y0)
+        return cls(table[STAT_COLUMNS + COVARIATE_COLUMNS])
+
+    @classmethod
+    def from_chunks(cls, chunks, **kwargs):
+        """Merge the statistics of an iterable of DataFrame chunks."""
+        return reduce(cls.merge, (cls.from_frame(chunk, **kwargs) for chunk in chunks))
+
+    def merge(self, other):
+        """Statistics of the union of the rows behind ``self`` and ``other``."""
+        index = self.table.index.union(other.table.index)
+        empty = {'n': 0, 'mean': 0.0, 'm2': 0.0, 'min': np.inf, 'max': -np.inf,
+                 'mean_x': 0.0, 'm2_x': 0.0, 'c_xy': 0.0}
+        a = self.table.reindex(index).fillna(empty)
+        b = other.table.reindex(index).fillna(empty)
+        merged = pd.DataFrame(merge_moments(a, b), index=index)[list(self.table.columns)]
+        merged['n'] = merged['n'].astype(np.int64)
+        return SufficientStats(merged)
+
+    __add__ = merge
+
+    def cell(self, group, segment=None):
+        """Moments of one group, in one segment or over all segments."""
+        if segment is not None:
+            return self.table.loc[(group, segment)]
+        rows = self.table.xs(group, level='group')
+        merged = reduce(merge_moments, (row for _, row in rows.iterrows()))
+        return pd.Series({name: np.asarray(value).item() for name, value in merged.items()})
+
+    def compare(self, segment=None, confidence=0.95):
+        """t-test, CI and Cohen's d of treatment vs control (overall by default)."""
+        control, treatment = GROUPS
+        return compare_moments(self.cell(control, segment), self.cell(treatment, segment), confidence)
+
+    def summary(self, confidence=0.95):
+        """``compare`` for the overall effect and each segment, one row each."""
+        # Segments with orders in both groups; the others have no comparison
+        present = [set(self.table.xs(group, level='group').index) for group in GROUPS]
+        segments = [s for s in SEGMENT_LABELS if all(s in cells for cells in present)]
+        rows = {'Overall': self.compare(None, confidence)}
+        rows.update({segment: self.compare(segment, confidence) for segment in segments})
+        return pd.DataFrame.from_dict(rows, orient='index')
+
+    @property
+    def sum(self):
+        return self.table['n'] * self.table['mean']
+
+    @property
+    def sum_sq(self):
+        return self.table['m2'] + self.table['n'] * self.table['mean'] ** 2
+
+    def std(self, ddof=1):
+        return np.sqrt(self.table['m2'] / (self.table['n'] - ddof))
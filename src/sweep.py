@@ -0,0 +1,216 @@
+"""Parameter sweep of the treatment simulation and its segment economics.
+
+For each combination of threshold, response_rate and (min_addition,
+max_addition), the sweep simulates the responders with treatment_assignment's
+``simulate_responders``, computes ``compute_final_revenue``, and rebuilds the economic impact table of
+results_summary (revenue from added items, shipping absorbed, net impact
+and ROI per segment, plus an ``All`` row).
+
+Grid points are spread over a process pool. The order columns
+(total_price, total_shipping, group, segment) are copied once into shared
+memory, and each worker maps them as read-only NumPy arrays instead of
+receiving its own pickled copy. Every grid point and replicate draws from
+its own ``src.rng`` streams, keyed by (grid point, replicate), so results do
+not depend on the number of processes.
+
+    python -m src.sweep --thresholds 80 100 120 --response-rates 0.3 0.4 0.5
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from .artifacts import load_processed
+from .rng import SEED, stream
+from .simulation import (MAX_ADDITION, MIN_ADDITION, RESPONSE_RATE, SEGMENT_LABELS, THRESHOLD,
+                         compute_final_revenue, segment_codes, simulate_responders)
+
+
+ECONOMICS_COLUMNS = ['segment', 'n_control', 'n_treatment', 'control_revenue', 'treatment_revenue',
+                     'revenue_difference', 'per_customer_diff', 'revenue_from_additions',
+                     'shipping_cost_absorbed', 'net_impact', 'roi_pct']
+
+# Arrays mapped from shared memory in each worker process
+_shared = {}
+
+
+def economics(experiment_results, threshold=THRESHOLD, segments=None):
+    """Segment economics of one realization, as in results_summary.
+
+    ``experiment_results`` needs total_price, total_shipping, group and
+    final_price (``simulate_responders``); revenue is
+    ``compute_final_revenue``. ``segments`` are precomputed
+    ``segment_codes`` of total_price, if available. Returns a DataFrame with
+    one row per segment and an ``All`` row.
+    """
+    price = experiment_results['total_price'].to_numpy(dtype=np.float64)
+    shipping = experiment_results['total_shipping'].to_numpy(dtype=np.float64)
+    final_price = experiment_results['final_price'].to_numpy(dtype=np.float64)
+    treated = (experiment_results['group'] == 'treatment').to_numpy()
+    segments = segment_codes(price) if segments is None else segments
+
+    n_segments = len(SEGMENT_LABELS)
+    in_segment = segments >= 0
+    segments = np.where(in_segment, segments, 0)
+
+    free_shipping = treated & (final_price >= threshold)
+    revenue = compute_final_revenue(experiment_results, threshold)
+    added = final_price - price
+
+    def per_segment(mask, weights=None):
+        mask = mask & in_segment
+        return np.bincount(segments[mask], weights=None if weights is None else weights[mask],
+                           minlength=n_segments)
+
+    table = pd.DataFrame({
+        'segment': SEGMENT_LABELS,
+        'n_control': per_segment(~treated),
+        'n_treatment': per_segment(treated),
+        'control_revenue': per_segment(~treated, revenue),
+        'treatment_revenue': per_segment(treated, revenue),
+        'revenue_from_additions': per_segment(treated, added),
+        'shipping_cost_absorbed': per_segment(free_shipping, shipping),
+    })
+    total = table.drop(columns='segment').sum()
+    table.loc[len(table)] = {'segment': 'All', **total}
+    table = table.astype({'n_control': np.int64, 'n_treatment': np.int64})
+
+    table['revenue_difference'] = table['treatment_revenue'] - table['control_revenue']
+    table['per_customer_diff'] = (table['treatment_revenue'] / table['n_treatment']
+                                  - table['control_revenue'] / table['n_control'])
+    table['net_impact'] = table['revenue_from_additions'] - table['shipping_cost_absorbed']
+    table['roi_pct'] = table['net_impact'] / table['shipping_cost_absorbed'] * 100
+    return table[ECONOMICS_COLUMNS]
+
+
+def parameter_grid(thresholds=(THRESHOLD,), response_rates=(RESPONSE_RATE,),
+                   addition_ranges=((MIN_ADDITION, MAX_ADDITION),)):
+    """Every combination of the given values, as a list of parameter dicts."""
+    return [
+        {'threshold': threshold, 'response_rate': rate,
+         'min_addition': low, 'max_addition': high}
+        for threshold, rate, (low, high) in itertools.product(thresholds, response_rates, addition_ranges)
+    ]
+
+
+def _orders(arrays):
+    """The order arrays as a design frame, built once per process."""
+    if 'orders' not in arrays:
+        arrays['orders'] = pd.DataFrame({
+            'total_price': arrays['total_price'],
+            'total_shipping': arrays['total_shipping'],
+            'group': np.where(arrays['treated'], 'treatment', 'control'),
+        })
+    return arrays['orders']
+
+
+def _evaluate(params, point, replicate, seed, arrays=None):
+    arrays = arrays or _shared
+    results = simulate_responders(_orders(arrays), random_state=stream(seed, 'responders', point, replicate),
+                                  extra_random_state=stream(seed, 'extras', point, replicate), **params)
+    table = economics(results, params['threshold'], arrays['segment'])
+    for name, value in reversed([*params.items(), ('replicate', replicate)]):
+        table.insert(0, name, value)
+    return table
+
+
+def _share(arrays):
+    """Copy arrays into one shared memory block; return (block, layout)."""
+    size = sum(a.nbytes for a in arrays.values())
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    layout, offset = [], 0
+    for name, array in arrays.items():
+        view = np.ndarray(array.shape, array.dtype, buffer=block.buf, offset=offset)
+        view[:] = array
+        layout.append((name, array.dtype.str, array.shape, offset))
+        offset += array.nbytes
+    return block, layout
+
+
+def _attach(block_name, layout):
+    """Worker initializer: map the shared order arrays read-only."""
+    block = shared_memory.SharedMemory(name=block_name)
+    _shared['_block'] = block  # keep the mapping alive for the worker's lifetime
+    for name, dtype, shape, offset in layout:
+        view = np.ndarray(shape, np.dtype(dtype), buffer=block.buf, offset=offset)
+        view.flags.writeable = False
+        _shared[name] = view
+
+
+def _evaluate_task(task):
+    return _evaluate(*task)
+
+
+def run_sweep(experiment_design, grid=None, replicates=1, seed=SEED, processes=None):
+    """Evaluate the simulation over a parameter grid.
+
+    ``grid`` is a list of parameter dicts (see ``parameter_grid``). Returns a
+    tidy DataFrame: one row per grid point, replicate and segment.
+    """
+    grid = grid or parameter_grid()
+    price = experiment_design['total_price'].to_numpy(dtype=np.float64)
+    arrays = {
+        'total_price': price,
+        'total_shipping': experiment_design['total_shipping'].to_numpy(dtype=np.float64),
+        'treated': (experiment_design['group'] == 'treatment').to_numpy(),
+        'segment': segment_codes(price),
+    }
+
+    tasks = [(params, i, r, seed) for i, params in enumerate(grid) for r in range(replicates)]
+
+    processes = processes or os.cpu_count()
+    if processes == 1 or len(tasks) == 1:
+        tables = [_evaluate(*task, arrays=arrays) for task in tasks]
+    else:
+        block, layout = _share(arrays)
+        try:
+            with ProcessPoolExecutor(max_workers=processes, initializer=_attach,
+                                     initargs=(block.name, layout)) as pool:
+                chunksize = max(1, len(tasks) // (4 * processes))
+                tables = list(pool.map(_evaluate_task, tasks, chunksize=chunksize))
+        finally:
+            block.close()
+            block.unlink()
+    return pd.concat(tables, ignore_index=True)
+
+
+def _addition_range(text):
+    low, high = text.split(':')
+    return float(low), float(high)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the treatment simulation over a parameter grid")
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[THRESHOLD])
+    parser.add_argument('--response-rates', type=float, nargs='+', default=[RESPONSE_RATE])
+    parser.add_argument('--additions', type=_addition_range, nargs='+',
+                        default=[(MIN_ADDITION, MAX_ADDITION)], help="min:max pairs, e.g. 15:35 10:50")
+    parser.add_argument('--replicates', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--processes', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('--output', help="write the full result to this CSV")
+    args = parser.parse_args()
+
+    design = load_processed('experiment_design', columns=['total_price', 'total_shipping', 'group'])
+    grid = parameter_grid(args.thresholds, args.response_rates, args.additions)
+
+    start = time.perf_counter()
+    result = run_sweep(design, grid, args.replicates, args.seed, args.processes)
+    print(f"{len(grid) * args.replicates:,} simulations in {time.perf_counter() - start:.2f}s\n")
+
+    if args.output:
+        result.to_csv(args.output, index=False)
+
+    params = ['threshold', 'response_rate', 'min_addition', 'max_addition']
+    summary = (result.groupby(params + ['segment'], sort=False)[['net_impact', 'roi_pct']].mean()
+               .unstack('segment')[['net_impact', 'roi_pct']])
+    print(summary.round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+import pytest
+
+from src import assignment
+from src.assignment import TEST_VECTORS, assign, assign_units, buckets, check_test_vectors
+
+
+def test_test_vectors_pass():
+    check_test_vectors()
+
+
+def test_test_vectors_mismatch_raises(monkeypatch):
+    (experiment_id, unit), expected = next(iter(TEST_VECTORS.items()))
+    monkeypatch.setitem(assignment.TEST_VECTORS, (experiment_id, unit), (expected + 1) % assignment.BUCKETS)
+    with pytest.raises(RuntimeError, match=unit):
+        check_test_vectors()
+
+
+def test_batch_matches_per_request():
+    units = [unit for _, unit in TEST_VECTORS] + ['a', 'b', 'c']
+    batch_buckets = buckets(units)
+    batch_groups = assign_units(units)
+    for unit, bucket, group in zip(units, batch_buckets, batch_groups):
+        assert assign(unit) == (bucket, group)
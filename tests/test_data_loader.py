@@ -0,0 +1,58 @@
+import shutil
+
+import pandas as pd
+import pytest
+
+from src import data_loader
+from src.schema import apply_schema
+
+
+@pytest.fixture
+def raw_copy(tmp_path, monkeypatch):
+    """Point the loader at a copy of the sellers table and an empty cache."""
+    raw_dir = tmp_path / 'raw'
+    raw_dir.mkdir()
+    shutil.copy(data_loader.raw_path('sellers'), raw_dir / data_loader.RAW_FILES['sellers'])
+    monkeypatch.setattr(data_loader, 'RAW_DIR', raw_dir)
+    monkeypatch.setattr(data_loader, 'CACHE_DIR', tmp_path / 'cache')
+    return raw_dir / data_loader.RAW_FILES['sellers']
+
+
+def test_cached_load_matches_read_csv(raw_copy):
+    expected = pd.read_csv(raw_copy)
+    pd.testing.assert_frame_equal(data_loader.load_raw('sellers'), expected)  # builds the cache
+    assert data_loader.cache_path('sellers').exists()
+    pd.testing.assert_frame_equal(data_loader.load_raw('sellers'), expected)  # reads it
+
+
+def test_column_projection(raw_copy):
+    columns = ['seller_id', 'seller_state']
+    pd.testing.assert_frame_equal(data_loader.load_raw('sellers', columns=columns),
+                                  pd.read_csv(raw_copy, usecols=columns))
+
+
+def test_changed_source_rebuilds_cache(raw_copy):
+    data_loader.load_raw('sellers')
+    old_cache = data_loader.cache_path('sellers')
+
+    lines = raw_copy.read_text().splitlines(keepends=True)
+    raw_copy.write_text(''.join(lines[:-10]))
+
+    assert len(data_loader.load_raw('sellers')) == len(lines) - 11
+    assert data_loader.cache_path('sellers') != old_cache
+    assert not old_cache.exists()
+
+
+def test_unknown_table():
+    with pytest.raises(KeyError):
+        data_loader.raw_path('reviews')
+
+
+def test_typed_load_applies_schema(raw_copy):
+    expected = apply_schema(pd.read_csv(raw_copy), 'sellers')
+    pd.testing.assert_frame_equal(data_loader.load_table('sellers'), expected)  # builds the cache
+    pd.testing.assert_frame_equal(data_loader.load_table('sellers'), expected)
+    pd.testing.assert_frame_equal(data_loader.load_table('sellers', use_cache=False), expected)
+
+    categories = expected['seller_state'].cat.categories
+    assert list(categories) == sorted(categories)
@@ -0,0 +1,15 @@
+import pandas as pd
+
+from src.artifacts import PROCESSED_DIR, load_processed
+from src.design import design_experiment
+from src.power import design_parameters
+from src.rng import SEED, stream
+
+
+def test_reproduces_committed_experiment_design():
+    order_totals = load_processed('order_totals')
+    n = 2 * design_parameters(order_totals['order_total'])['n']
+    design = design_experiment(order_totals, n, stream(SEED, 'sample'), stream(SEED, 'assignment'))
+
+    committed = pd.read_csv(PROCESSED_DIR / 'experiment_design.csv')
+    pd.testing.assert_frame_equal(design.reset_index(drop=True), committed, check_dtype=False)
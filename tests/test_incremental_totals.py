@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import incremental_totals
+from src.data_loader import load_table
+from src.order_totals import aggregate_order_totals
+
+
+@pytest.fixture(scope='module')
+def items():
+    return incremental_totals._prepare_items(
+        load_table('order_items', columns=incremental_totals.ITEM_COLUMNS))
+
+
+def _delta(items, seed=0):
+    """Changed rows of existing orders, new items of existing orders and a new order."""
+    rng = np.random.default_rng(seed)
+    changed = items.iloc[rng.choice(len(items), 50, replace=False)].copy()
+    changed['price'] = np.round(changed['price'] * 1.1, 2)
+
+    appended = items.iloc[rng.choice(len(items), 20, replace=False)].copy()
+    appended['order_item_id'] = 100
+
+    new_order = items.iloc[:3].copy()
+    new_order['order_id'] = 'f' * 32
+    return pd.concat([changed, appended, new_order], ignore_index=True).sample(frac=1, random_state=seed)
+
+
+def _ledger(items, delta):
+    return incremental_totals._prepare_items(pd.concat([items, delta], ignore_index=True))
+
+
+def test_refresh_matches_full_rebuild(items):
+    delta = _delta(items)
+    order_totals, new_items = incremental_totals.refresh_order_totals(aggregate_order_totals(items), items, delta)
+
+    ledger = _ledger(items, delta)
+    pd.testing.assert_frame_equal(order_totals, aggregate_order_totals(ledger), check_dtype=False)
+    pd.testing.assert_frame_equal(new_items, ledger, check_dtype=False)
+
+
+def test_folded_partitions_match_full_rebuild(items, tmp_path):
+    state_dir = tmp_path / 'state'
+    incremental_totals.init_state(state_dir)
+    ledger = pd.concat([pd.read_parquet(path) for path in sorted((state_dir / 'items').glob('*.parquet'))],
+                       ignore_index=True)
+
+    delta = _delta(ledger, seed=1)
+    delta_path = tmp_path / 'delta.csv'
+    delta.to_csv(delta_path, index=False)
+
+    assert incremental_totals.fold_delta(delta_path, state_dir) == len(delta)
+    assert incremental_totals.fold_delta(delta_path, state_dir) == 0  # same batch again
+
+    pd.testing.assert_frame_equal(incremental_totals.current_order_totals(state_dir),
+                                  aggregate_order_totals(_ledger(ledger, delta)),
+                                  check_dtype=False)
@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from src.data_loader import load_raw, load_table
+from src.order_totals import ORDER_TOTALS_COLUMNS, PROCESSED_DIR, aggregate_order_totals
+
+
+ITEM_COLUMNS = ['order_id', 'price', 'freight_value']
+
+
+@pytest.fixture(scope='module')
+def committed():
+    return pd.read_csv(PROCESSED_DIR / 'order_totals.csv')
+
+
+@pytest.mark.parametrize('loader', [load_raw, load_table])
+def test_matches_committed_order_totals(loader, committed):
+    totals = aggregate_order_totals(loader('order_items', columns=ITEM_COLUMNS),
+                                    loader('orders', columns=['order_id']))
+    assert list(totals.columns) == ORDER_TOTALS_COLUMNS
+    pd.testing.assert_frame_equal(totals, committed, check_dtype=False)
+
+
+def test_unsorted_items_and_orders_filter():
+    items = pd.DataFrame({
+        'order_id': ['c', 'a', 'x', 'c', 'a', 'c'],
+        'price': [10.0, 1.5, 99.0, 20.0, 2.5, 0.1],
+        'freight_value': [1.0, 0.5, 9.0, 2.0, 0.5, 0.0],
+    })
+    orders = pd.DataFrame({'order_id': ['a', 'b', 'c']})
+
+    totals = aggregate_order_totals(items, orders)
+    expected = (orders.merge(items, on='order_id')
+                .groupby('order_id', as_index=False)
+                .agg(total_price=('price', 'sum'), total_shipping=('freight_value', 'sum'),
+                     num_items=('price', 'count')))
+    expected['order_total'] = expected['total_price'] + expected['total_shipping']
+    pd.testing.assert_frame_equal(totals, expected, check_dtype=False)
+
+    categorical = items.astype({'order_id': 'category'})
+    pd.testing.assert_frame_equal(aggregate_order_totals(categorical, orders), totals)
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from src.design import GROUPS
+from src.srm import SrmMonitor, srm_table
+
+
+def events(n, treatment_share, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'group': np.where(rng.random(n) < treatment_share, 'treatment', 'control'),
+        'segment': rng.choice(['Small', 'Medium', 'Large'], n),
+        'customer_state': rng.choice(['SP', 'RJ', 'MG', 'AC'], n, p=[0.5, 0.3, 0.199, 0.001]),
+    })
+
+
+def replay(orders, dimensions):
+    monitor = SrmMonitor(dimensions=dimensions)
+    for event in orders[['group'] + dimensions].to_dict('records'):
+        monitor.update(event.pop('group'), **event)
+    return monitor
+
+
+def test_monitor_counts_match_srm_table():
+    dimensions = ['segment', 'customer_state']
+    orders = events(5_000, 0.5)
+    streamed = replay(orders, dimensions).table()
+    batch = srm_table(orders, dimensions=dimensions)
+
+    columns = GROUPS + ['n']
+    pd.testing.assert_frame_equal(streamed[columns].sort_index(), batch[columns].sort_index(),
+                                  check_dtype=False, check_names=False)
+    assert not streamed['alert'].any()
+
+
+def test_monitor_alerts_on_skewed_split():
+    monitor = replay(events(5_000, 0.6), ['segment'])
+    assert ('overall', 'all') in monitor.alerted
+    assert monitor.p_value(('overall', 'all')) < monitor.alpha
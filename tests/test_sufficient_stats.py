@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from src.sufficient_stats import SufficientStats
+
+
+def chunks(df, count=7):
+    bounds = np.linspace(0, len(df), count + 1).astype(int)
+    return [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+@pytest.fixture(scope='module')
+def orders():
+    rng = np.random.default_rng(0)
+    n = 5_000
+    return pd.DataFrame({
+        'group': rng.choice(['control', 'treatment'], n),
+        'total_price': rng.gamma(2.0, 60.0, n),
+        'final_revenue': rng.gamma(2.0, 80.0, n),
+    })
+
+
+def test_merged_chunks_match_one_pass(orders):
+    merged = SufficientStats.from_chunks(chunks(orders))
+    whole = SufficientStats.from_frame(orders)
+    pd.testing.assert_frame_equal(merged.table, whole.table, check_exact=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize('segment', [None, 'Small', 'Medium', 'Large'])
+def test_compare_matches_ttest_ind(orders, segment):
+    result = SufficientStats.from_chunks(chunks(orders)).compare(segment)
+
+    if segment is None:
+        rows = orders
+    else:
+        rows = orders[pd.cut(orders['total_price'], [0, 75, 150, np.inf],
+                             labels=['Small', 'Medium', 'Large']) == segment]
+    control = rows.loc[rows['group'] == 'control', 'final_revenue']
+    treatment = rows.loc[rows['group'] == 'treatment', 'final_revenue']
+    t_statistic, p_value = stats.ttest_ind(treatment, control)
+
+    assert result['n_control'] == len(control)
+    assert result['n_treatment'] == len(treatment)
+    assert result['difference'] == pytest.approx(treatment.mean() - control.mean(), rel=1e-9)
+    assert result['t_statistic'] == pytest.approx(t_statistic, rel=1e-9)
+    assert result['p_value'] == pytest.approx(p_value, rel=1e-9)